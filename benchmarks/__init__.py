@@ -0,0 +1,10 @@
+"""
+Offline micro-benchmarks of the session and recommendation hot paths.
+
+Discord, youtube_dl and aiohttp are replaced with stubs so nothing touches the
+network, run from the repository root with
+
+    python -m benchmarks [--output results.json] [--compare old.json]
+
+Results are written as json, by default to bench_results/<commit>.json.
+"""
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from benchmarks import stubs
+
+stubs.install()
+
+from bot.exts.music.music import target_features  # noqa: E402
+from bot.exts.music.player import MusicSession, PlayStyle, Track, TrackType  # noqa: E402
+from bot.exts.music.recommend import FEATURE_NAMES, FeaturePool, TasteProfile  # noqa: E402
+
+QUEUE_SIZES = [10, 100, 1000, 10000, 50000]
+# the feature averaging of get_recommendations used to look at no more tracks
+MAX_FEATURE_TRACKS = 100
+RESULTS_DIRECTORY = "bench_results"
+
+
+def make_tracks(size: int) -> List[Track]:
+    rng = random.Random(size)
+    tracks = []
+    for i in range(size):
+        track = Track(
+            title=f"Track {i}",
+            id=f"{i:022d}",
+            thumbnail="https://i.scdn.co/image/placeholder",
+            url=f"https://open.spotify.com/track/{i:022d}",
+            duration=rng.randint(90, 420),
+            type=TrackType.SPOTIFY,
+            commander_id=rng.randint(1, 8),
+            artists=[f"Artist {i % 50}"],
+        )
+        tracks.append(track)
+    return tracks
+
+
+def make_session(size: int) -> MusicSession:
+    author = SimpleNamespace(id=1, voice=SimpleNamespace(channel=SimpleNamespace(id=2)))
+    ctx = SimpleNamespace(
+        author=author,
+        guild=SimpleNamespace(id=3, name="benchmark"),
+        channel=SimpleNamespace(id=4),
+    )
+    session = MusicSession.from_context(
+        make_tracks(size), ctx, auto_queue=False  # type: ignore
+    )
+    session._voice_client = SimpleNamespace(is_playing=lambda: True)
+    session.at = size // 2
+    session.start_queue()
+    return session
+
+
+def make_features(size: int) -> List[dict]:
+    rng = random.Random(size)
+    return [{name: rng.random() for name in FEATURE_NAMES} for _ in range(size)]
+
+
+def average_features(features: List[dict]) -> Dict[str, float]:
+    taste = TasteProfile()
+    for i, track_features in enumerate(features):
+        taste.update(str(i), track_features, 1.0)
+    return target_features(taste.vector())  # type: ignore
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    timer = timeit.Timer(function)
+    loops, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=loops))
+    return {"usec": best / loops * 1e6, "loops": loops}
+
+
+def run(sizes: List[int], repeat: int) -> List[dict]:
+    results = []
+    feature_sizes = set()
+
+    def record(name: str, size: int, function: Callable[[], object]):
+        result = {"name": name, "size": size, **measure(function, repeat)}
+        results.append(result)
+        print(f"{name:<36} {size:>6} {result['usec']:>12.2f} us")
+
+    for size in sizes:
+        session = make_session(size)
+        total = session.total_time()
+
+        record("MusicSession.get_queue_embed", size, session.get_queue_embed)
+        record("MusicSession.format_duration", size, lambda: session.format_duration(total))
+        record("MusicSession.remaining_tracks", size, lambda: session.remaining_tracks)
+        record("MusicSession.total_time", size, session.total_time)
+
+        for style in PlayStyle:
+            if style is PlayStyle.AUTO_QUEUE:
+                # not a play style a session can be switched into
+                continue
+            session.style = style
+            record(
+                f"get_next_song_index[{style.name}]", size, session.get_next_song_index
+            )
+        session.style = PlayStyle.NORMAL
+
+        # kept under its old name so runs compare across commits, the averaging
+        # is now a taste profile built from the features
+        feature_size = min(size, MAX_FEATURE_TRACKS)
+        if feature_size not in feature_sizes:
+            feature_sizes.add(feature_size)
+            features = make_features(feature_size)
+            record("average_features", feature_size, lambda: average_features(features))
+
+        # the profile is updated per track, so a long queue costs nothing extra
+        taste = TasteProfile()
+        for track, track_features in zip(session.queue, make_features(size)):
+            taste.update(track.id, track_features, 1.0)
+        record("TasteProfile.update", size, lambda: taste.update(track.id, track_features, 1.0))
+        record("target_features", size, lambda: target_features(taste.vector()))  # type: ignore
+
+        pool = FeaturePool(size)
+        for track, track_features in zip(session.queue, make_features(size)):
+            pool.add(track, track_features)
+        target = [0.5] * len(FEATURE_NAMES)
+        # a tenth of the pool counts as already queued, as on an auto-queue refill
+        exclude = session.queue.track_ids()[: size // 10]
+        record("FeaturePool.nearest", size, lambda: pool.nearest(target, 3, exclude))
+
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: List[dict], previous_path: str):
+    with open(previous_path, "r") as file:
+        previous = json.load(file)
+    before = {(r["name"], r["size"]): r["usec"] for r in previous["results"]}
+
+    print(f"\nCompared to {previous['commit']}:")
+    for result in results:
+        key = (result["name"], result["size"])
+        if key not in before:
+            continue
+        ratio = result["usec"] / before[key]
+        print(f"{result['name']:<36} {result['size']:>6} {ratio:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=QUEUE_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="where to write the json results")
+    parser.add_argument("--compare", help="json results of an earlier run")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    results = run(args.sizes, args.repeat)
+
+    output = args.output or os.path.join(RESULTS_DIRECTORY, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(
+            {
+                "commit": commit,
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"\nWrote {len(results)} results to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ Global Constants are typed and defined here.
 Constants that doesn't need to be available throughout the library
 are defined locally where they're required.
 """
-from typing import List
+from typing import List, Optional
 from yaml import load, SafeLoader
 from os import getenv
 from dotenv import load_dotenv
@@ -19,3 +19,37 @@ ADMINS_ID_LIST: List[int] = CONFIGURATION["bot"]["admins"]
 PREFIX: str = CONFIGURATION["bot"]["prefix"]
 DISCORD_TOKEN: str = getenv("TOKEN")
 DEBUG: bool = CONFIGURATION["bot"]["debug"]
+SHARDED: bool = CONFIGURATION["bot"]["sharded"]
+SHARD_COUNT: Optional[int] = CONFIGURATION["bot"]["shard_count"]
+METRICS_HOST: str = CONFIGURATION["bot"]["metrics_host"]
+METRICS_PORT: int = CONFIGURATION["bot"]["metrics_port"]
+
+SOURCE_CACHE_SIZE: int = CONFIGURATION["music"]["source_cache_size"]
+SOURCE_CACHE_MARGIN: int = CONFIGURATION["music"]["source_cache_margin"]
+VIDEO_INDEX_PATH: str = CONFIGURATION["music"]["video_index_path"]
+SEARCH_CONCURRENCY: int = CONFIGURATION["music"]["search_concurrency"]
+SEARCH_GLOBAL_CONCURRENCY: int = CONFIGURATION["music"]["search_global_concurrency"]
+SEARCH_CACHE_SIZE: int = CONFIGURATION["music"]["search_cache_size"]
+SEARCH_CACHE_TTL: int = CONFIGURATION["music"]["search_cache_ttl"]
+SEARCH_CACHE_MISS_TTL: int = CONFIGURATION["music"]["search_cache_miss_ttl"]
+SUGGESTION_GUILD_SIZE: int = CONFIGURATION["music"]["suggestion_guild_size"]
+SUGGESTION_GLOBAL_SIZE: int = CONFIGURATION["music"]["suggestion_global_size"]
+LOOKAHEAD: int = CONFIGURATION["music"]["lookahead"]
+AUDIO_FEATURES_CACHE_SIZE: int = CONFIGURATION["music"]["audio_features_cache_size"]
+RECOMMENDER_POOL_SIZE: int = CONFIGURATION["music"]["recommender_pool_size"]
+RECOMMENDER_MIN_POOL: int = CONFIGURATION["music"]["recommender_min_pool"]
+TASTE_DECAY: float = CONFIGURATION["music"]["taste_decay"]
+TASTE_FINISH_WEIGHT: float = CONFIGURATION["music"]["taste_finish_weight"]
+TASTE_SKIP_WEIGHT: float = CONFIGURATION["music"]["taste_skip_weight"]
+IDLE_TIMEOUT: int = CONFIGURATION["music"]["idle_timeout"]
+SPOTIFY_POOL_SIZE: int = CONFIGURATION["music"]["spotify_pool_size"]
+SPOTIFY_RETRIES: int = CONFIGURATION["music"]["spotify_retries"]
+CONTROLLER_DEBOUNCE: float = CONFIGURATION["music"]["controller_debounce"]
+CONTROLLER_EDITS: int = CONFIGURATION["music"]["controller_edits"]
+CONTROLLER_EDIT_PERIOD: float = CONFIGURATION["music"]["controller_edit_period"]
+AUDIO_CACHE_ENABLED: bool = CONFIGURATION["music"]["audio_cache_enabled"]
+AUDIO_CACHE_DIRECTORY: str = CONFIGURATION["music"]["audio_cache_directory"]
+AUDIO_CACHE_MAX_MB: int = CONFIGURATION["music"]["audio_cache_max_mb"]
+PLAYBACK_MODE: str = CONFIGURATION["music"]["playback_mode"]
+SNAPSHOT_PATH: str = CONFIGURATION["music"]["snapshot_path"]
+SNAPSHOT_INTERVAL: int = CONFIGURATION["music"]["snapshot_interval"]
@@ -7,8 +7,10 @@ from discord import Embed
 from discord.commands.options import Option
 from discord.utils import format_dt
 
+from bot.constants import METRICS_PORT
 from bot.utils.checks import is_admin
 from bot.utils.extensions import EXTENSIONS
+from bot.utils.metrics import METRICS_SERVER, PLAY_LATENCY, PLAY_STAGES
 
 
 OPT_EXTS = [e.split('.')[-1] for e in EXTENSIONS]
@@ -18,6 +20,12 @@ class AdminIO(commands.Cog):
         self.bot = bot
         self.extension_state = []
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # the server outlives reloads of this cog, it is only started once
+        if METRICS_PORT and not METRICS_SERVER.running:
+            await METRICS_SERVER.start()
+
     @slash_command(name="reload")
     @commands.check(is_admin)
     async def reload_cog(
@@ -58,6 +66,42 @@ class AdminIO(commands.Cog):
         else:
             await ctx.respond("☑️", ephemeral=True)
 
+    @slash_command(name="latency")
+    @commands.check(is_admin)
+    async def latency(
+        self,
+        ctx: ApplicationContext,
+        guild_id: Option(str, description="Only this guild's timings.", required=False, default=None), # type:ignore
+    ):
+        """
+        Shows how long every stage of /play takes.
+        """
+        # discord's integer options can't hold a snowflake, so it comes as text
+        if guild_id and not guild_id.isdigit():
+            await ctx.respond(f"`{guild_id}` is not a guild id.", ephemeral=True)
+            return
+
+        stages = PLAY_LATENCY.stages(int(guild_id) if guild_id else None)
+        if not stages:
+            await ctx.respond("No timings recorded yet.", ephemeral=True)
+            return
+
+        embed = Embed(color=0x2F3136, title="/play latency")
+        for stage in PLAY_STAGES:
+            histogram = stages.get(stage)
+            if histogram is None or not histogram.count:
+                continue
+            embed.add_field(
+                name=stage,
+                value=(
+                    f"n = `{histogram.count}`\n"
+                    f"mean `{histogram.sum / histogram.count:.3f}s`\n"
+                    f"p50 ≤ `{histogram.quantile(0.5)}s`\n"
+                    f"p95 ≤ `{histogram.quantile(0.95)}s`"
+                ),
+            )
+        await ctx.respond(embed=embed, ephemeral=True)
+
 
 def setup(bot):
     bot.add_cog(AdminIO(bot))
@@ -1,16 +1,176 @@
-from spotipy import Spotify
-from functools import partial
-
-class AsyncSpotify(Spotify):
-    def __init__(self, loop, auth=None, requests_session=True, client_credentials_manager=None, oauth_manager=None, auth_manager=None, proxies=None, requests_timeout=5, status_forcelist=None, retries=..., status_retries=..., backoff_factor=0.3, language=None):
-        super().__init__(auth, requests_session, client_credentials_manager, oauth_manager, auth_manager, proxies, requests_timeout, status_forcelist, retries, status_retries, backoff_factor, language)
-        self._loop = loop
-
-    def __getattribute__(self, __name: str):
-        if __name.startswith("async_"):
-            func = super().__getattribute__(__name[6:])
-            if callable(func):
-                async def async_function(*args, **kwargs):
-                    return await self._loop.run_in_executor(None, partial(func, *args, **kwargs))
-                return async_function
-        return super().__getattribute__(__name)
+import asyncio
+import time
+import aiohttp
+
+from typing import Any, AsyncIterator, List, Optional
+from urllib.parse import urlparse
+
+from bot.constants import SPOTIFY_POOL_SIZE, SPOTIFY_RETRIES
+from bot.utils.errors import SpotifyError
+
+API_URL = "https://api.spotify.com/v1/"
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+
+def get_id(kind: str, value: str) -> str:
+    """
+    Returns the bare spotify id out of an id, a spotify uri or an
+    open.spotify.com link of the given kind.
+    """
+    if value.startswith("spotify:"):
+        return value.split(":")[-1]
+    if value.startswith("http"):
+        parts = urlparse(value).path.strip("/").split("/")
+        if kind in parts[:-1]:
+            return parts[parts.index(kind) + 1]
+        return parts[-1]
+    return value
+
+
+class AsyncSpotify:
+    """
+    A native asyncio client for the handful of spotify web api calls the bot
+    makes, built on a pooled keep-alive aiohttp session.
+
+    Authentication uses the client credentials flow, the token is cached and
+    refreshed shortly before it expires or whenever spotify rejects it.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        pool_size: int = SPOTIFY_POOL_SIZE,
+        retries: int = SPOTIFY_RETRIES,
+        timeout: int = 5,
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.pool_size = pool_size
+        self.retries = retries
+        self.timeout = timeout
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def get_token(self, stale: Optional[str] = None) -> str:
+        """
+        Returns a valid access token, passing the token that just got rejected
+        as `stale` forces a refresh unless another request already did one.
+        """
+        async with self._token_lock:
+            if (
+                self._token is None
+                or self._token == stale
+                or self._token_expires_at - 60 <= time.time()
+            ):
+                async with self.session.post(
+                    TOKEN_URL,
+                    data={"grant_type": "client_credentials"},
+                    auth=aiohttp.BasicAuth(self.client_id, self.client_secret),
+                ) as resp:
+                    payload = await resp.json(content_type=None)
+                    if resp.status != 200:
+                        raise SpotifyError(
+                            resp.status, payload.get("error_description", str(payload))
+                        )
+                self._token = payload["access_token"]
+                self._token_expires_at = time.time() + payload["expires_in"]
+            return self._token  # type: ignore
+
+    async def _get(self, url: str, **params) -> Any:
+        """
+        GETs an api endpoint, 429s are retried after the `Retry-After` the
+        api asks for.
+        """
+        if not url.startswith("https://"):
+            url = API_URL + url
+        params = {key: value for key, value in params.items() if value is not None}
+
+        token = await self.get_token()
+        for attempt in range(self.retries + 1):
+            can_retry = attempt < self.retries
+            async with self.session.get(
+                url, params=params, headers={"Authorization": f"Bearer {token}"}
+            ) as resp:
+                if resp.status == 429 and can_retry:
+                    delay = float(resp.headers.get("Retry-After", 1))
+                    print(f"[Spotify] Rate limited, retrying in {delay} seconds.")
+                    await asyncio.sleep(delay)
+                    continue
+                if resp.status == 401 and can_retry:
+                    token = await self.get_token(stale=token)
+                    continue
+                if resp.status >= 500 and can_retry:
+                    await asyncio.sleep(0.3 * 2**attempt)
+                    continue
+
+                payload = await resp.json(content_type=None)
+                if resp.status >= 400:
+                    error = (payload or {}).get("error", {})
+                    raise SpotifyError(resp.status, error.get("message", str(error)))
+                return payload
+
+    async def pages(self, page: dict) -> AsyncIterator[dict]:
+        """
+        Yields a paging object followed by every page that comes after it.
+        """
+        while True:
+            yield page
+            if not page.get("next"):
+                return
+            page = await self._get(page["next"])
+
+    async def track(self, track_id: str) -> dict:
+        return await self._get(f"tracks/{get_id('track', track_id)}")
+
+    async def playlist_items(
+        self, playlist_id: str, limit: int = 100, offset: int = 0
+    ) -> dict:
+        return await self._get(
+            f"playlists/{get_id('playlist', playlist_id)}/tracks",
+            limit=limit,
+            offset=offset,
+            additional_types="track",
+        )
+
+    async def album_tracks(self, album_id: str, limit: int = 50, offset: int = 0) -> dict:
+        return await self._get(
+            f"albums/{get_id('album', album_id)}/tracks", limit=limit, offset=offset
+        )
+
+    async def recommendations(
+        self, seed_tracks: List[str], limit: int = 20, **attributes
+    ) -> dict:
+        return await self._get(
+            "recommendations",
+            seed_tracks=",".join(get_id("track", t) for t in seed_tracks),
+            limit=limit,
+            **attributes,
+        )
+
+    async def audio_features(self, tracks: List[str]) -> List[Optional[dict]]:
+        """
+        Audio features of up to 100 tracks, unknown tracks come back as None.
+        """
+        payload = await self._get(
+            "audio-features", ids=",".join(get_id("track", t) for t in tracks)
+        )
+        return payload["audio_features"]
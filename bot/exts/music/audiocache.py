@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+
+from asyncio.subprocess import DEVNULL, PIPE
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from bot.exts.music.cache import LRUCache, is_opus_source
+
+
+class AudioCache:
+    """
+    An on-disk cache of tracks transcoded to ogg/opus, so that tracks which
+    get replayed are served from local files instead of being streamed again.
+
+    Files are evicted least recently used first once the cache grows past
+    `max_bytes`, and a manifest keeps the cache across restarts. The manifest
+    is written after every transcode and, for the recency of plays, at most
+    `save_interval` seconds after a cached track is played.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        executable: str,
+        concurrency: int = 2,
+        max_plays: int = 10000,
+        save_interval: float = 60,
+    ) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.executable = executable
+
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # track id -> size
+        self.save_interval = save_interval
+        self._plays = LRUCache(max_plays)  # track id -> plays while streamed
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._limit = asyncio.Semaphore(concurrency)
+        self._manifest = os.path.join(directory, "manifest.json")
+        self._dirty = False
+        self._saver: Optional[asyncio.TimerHandle] = None
+        self._load()
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._entries
+
+    def file_for(self, track_id: str) -> str:
+        return os.path.join(self.directory, f"{track_id}.ogg")
+
+    def _load(self):
+        try:
+            with open(self._manifest, "r") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            entries = []
+
+        for track_id, size in entries:
+            if os.path.exists(self.file_for(track_id)):
+                self._entries[track_id] = size
+                self.total_bytes += size
+        print(f"[AudioCache] Loaded {len(self._entries)} tracks, {self.total_bytes} bytes.")
+
+    def _write(self, entries: List[Tuple[str, int]]):
+        partial = self._manifest + ".part"
+        with open(partial, "w") as file:
+            json.dump(entries, file)
+        os.replace(partial, self._manifest)
+
+    def save(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._write(list(self._entries.items()))
+
+    def _schedule_save(self):
+        if self._saver is None:
+            self._saver = asyncio.get_running_loop().call_later(
+                self.save_interval, self._save_later
+            )
+
+    def _save_later(self):
+        self._saver = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        entries = list(self._entries.items())
+        future = asyncio.get_running_loop().run_in_executor(None, self._write, entries)
+        future.add_done_callback(self._on_saved)
+
+    def _on_saved(self, future: "asyncio.Future[None]"):
+        if future.exception() is not None:
+            print(f"[AudioCache] Failed to save the manifest: {future.exception()!r}")
+            self._dirty = True
+
+    def get(self, track_id: str) -> Optional[str]:
+        """
+        Returns the local file of a cached track and marks it as recently used.
+        """
+        if track_id not in self._entries:
+            return None
+
+        location = self.file_for(track_id)
+        if not os.path.exists(location):
+            self.total_bytes -= self._entries.pop(track_id)
+            self._dirty = True
+            return None
+
+        self._entries.move_to_end(track_id)
+        self._dirty = True
+        self._schedule_save()
+        return location
+
+    def note_play(self, track_id: str, repeating: bool, source: str):
+        """
+        Records a play of a streamed track and starts caching it once it is
+        played a second time or is about to be repeated.
+        """
+        plays = self._plays.get(track_id, 0) + 1
+        self._plays.put(track_id, plays)
+        if (plays > 1 or repeating) and track_id not in self._jobs:
+            task = asyncio.get_running_loop().create_task(self._transcode(track_id, source))
+            task.add_done_callback(lambda _: self._jobs.pop(track_id, None))
+            self._jobs[track_id] = task
+
+    async def _transcode(self, track_id: str, source: str):
+        location = self.file_for(track_id)
+        partial = location + ".part"
+        async with self._limit:
+            print(f"[AudioCache] Caching {track_id}.")
+            process = await asyncio.create_subprocess_exec(
+                self.executable,
+                "-nostdin",
+                "-loglevel", "error",
+                "-reconnect", "1",
+                "-reconnect_streamed", "1",
+                "-reconnect_delay_max", "5",
+                "-i", source,
+                "-vn",
+                # opus streams only need to be remuxed into ogg
+                "-c:a", "copy" if is_opus_source(source) else "libopus",
+                "-b:a", "128k",
+                "-f", "ogg",
+                "-y", partial,
+                stdout=DEVNULL,
+                stderr=PIPE,
+            )
+            _, error = await process.communicate()
+
+        if process.returncode != 0:
+            print(f"[AudioCache] Failed to cache {track_id}: {error.decode().strip()}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            return
+
+        os.replace(partial, location)
+        size = os.path.getsize(location)
+        self.total_bytes += size - self._entries.get(track_id, 0)
+        self._entries[track_id] = size
+        self._entries.move_to_end(track_id)
+        self._dirty = True
+        self._evict()
+        self.save()
+
+    def _evict(self):
+        # the most recent track is never evicted, it was just cached
+        for track_id in list(self._entries)[:-1]:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self.file_for(track_id))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # kept so that the removal is tried again on the next eviction
+                print(f"[AudioCache] Failed to evict {track_id}: {e!r}")
+                continue
+            self.total_bytes -= self._entries.pop(track_id)
+            self._dirty = True
+            print(f"[AudioCache] Evicted {track_id}.")
+
+    def close(self):
+        for task in self._jobs.values():
+            task.cancel()
+        if self._saver is not None:
+            self._saver.cancel()
+        self.save()
@@ -0,0 +1,135 @@
+import time
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from bot.constants import (
+    AUDIO_FEATURES_CACHE_SIZE,
+    SEARCH_CACHE_SIZE,
+    SOURCE_CACHE_MARGIN,
+    SOURCE_CACHE_SIZE,
+)
+
+# googlevideo urls carry their own expiry, anything else gets this lifetime
+DEFAULT_SOURCE_TTL = 60 * 60
+
+# youtube's webm audio formats encoded as opus, 171 and 172 are vorbis
+YOUTUBE_OPUS_ITAGS = ("249", "250", "251")
+
+
+class LRUCache:
+    """
+    A size capped mapping that evicts the least recently used entry first.
+
+    Sources are resolved inside executor threads so every access is guarded
+    by a lock.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TTLCache(LRUCache):
+    """
+    An LRU cache whose entries additionally expire after their own lifetime.
+    """
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry: Optional[Tuple[Any, float]] = super().get(key)
+        if entry is None:
+            return default
+
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self.pop(key)
+            return default
+        return value
+
+    def put(self, key: Hashable, value: Any, ttl: float):
+        super().put(key, (value, time.time() + ttl))
+
+
+def source_expiry(url: str) -> float:
+    """
+    Returns the unix timestamp at which a stream url stops being valid.
+    """
+    try:
+        return float(parse_qs(urlparse(url).query)["expire"][0])
+    except (KeyError, IndexError, ValueError):
+        return time.time() + DEFAULT_SOURCE_TTL
+
+
+def is_opus_source(location: str) -> bool:
+    """
+    Whether a stream url already carries opus audio. Youtube's webm audio
+    comes as vorbis as well, so the format is told apart by its itag.
+    """
+    query = parse_qs(urlparse(location).query)
+    if query.get("mime", [""])[0] == "audio/webm":
+        return query.get("itag", [""])[0] in YOUTUBE_OPUS_ITAGS
+    return urlparse(location).path.endswith(".opus")
+
+
+class SourceCache(LRUCache):
+    """
+    Resolved stream urls keyed by track id, a url is only handed out while it
+    is at least `margin` seconds away from expiring.
+    """
+
+    def __init__(self, maxsize: int, margin: int) -> None:
+        super().__init__(maxsize)
+        self.margin = margin
+
+    def is_stale(self, expires_at: float) -> bool:
+        return expires_at - self.margin <= time.time()
+
+    def get(self, key: Hashable, default: Any = None) -> Optional[str]:
+        entry: Optional[Tuple[str, float]] = super().get(key)
+        if entry is None:
+            return default
+
+        url, expires_at = entry
+        if self.is_stale(expires_at):
+            self.pop(key)
+            return default
+        return url
+
+    def put(self, key: Hashable, value: str):
+        super().put(key, (value, source_expiry(value)))
+
+
+SOURCE_CACHE = SourceCache(SOURCE_CACHE_SIZE, SOURCE_CACHE_MARGIN)
+AUDIO_FEATURES = LRUCache(AUDIO_FEATURES_CACHE_SIZE)
+SEARCH_CACHE = TTLCache(SEARCH_CACHE_SIZE)
@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+
+from itertools import count
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class IdleScheduler:
+    """
+    Idle deadlines of every guild kept in a single heap and served by one
+    background task, so waiting on an empty queue never blocks the event loop.
+
+    Re-arming or cancelling a guild leaves its old heap entry behind, stale
+    entries are recognised by their generation and skipped.
+    """
+
+    def __init__(self, on_idle: Callable[[int], Awaitable[None]]) -> None:
+        self.on_idle = on_idle
+
+        self._heap: List[Tuple[float, int, int]] = []  # (deadline, generation, guild id)
+        self._armed: Dict[int, int] = {}  # guild id -> generation
+        self._generations = count()
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._armed
+
+    def arm(self, guild_id: int, delay: float):
+        """
+        Calls on_idle with the guild id after delay seconds unless it gets
+        cancelled before that, arming an armed guild restarts its deadline.
+        """
+        loop = asyncio.get_running_loop()
+        generation = next(self._generations)
+        self._armed[guild_id] = generation
+        heapq.heappush(self._heap, (loop.time() + delay, generation, guild_id))
+
+        if len(self._heap) > 2 * len(self._armed) + 16:
+            self._heap = [e for e in self._heap if self._armed.get(e[2]) == e[1]]
+            heapq.heapify(self._heap)
+
+        if self._runner is None or self._runner.done():
+            self._runner = loop.create_task(self._run())
+        self._wakeup.set()
+
+    def cancel(self, guild_id: int) -> bool:
+        """
+        Disarms the guild, returns whether it had a pending deadline.
+        """
+        return self._armed.pop(guild_id, None) is not None
+
+    def close(self):
+        self._armed.clear()
+        self._heap.clear()
+        if self._runner is not None:
+            self._runner.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while self._heap and self._armed.get(self._heap[0][2]) != self._heap[0][1]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), self._heap[0][0] - loop.time()
+                )
+                # a new deadline was armed, it might be the earliest now
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, generation, guild_id = heapq.heappop(self._heap)
+                if self._armed.get(guild_id) == generation:
+                    del self._armed[guild_id]
+                    loop.create_task(self.on_idle(guild_id))
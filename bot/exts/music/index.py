@@ -0,0 +1,69 @@
+import sqlite3
+
+from os import makedirs, path
+from threading import Lock
+from typing import Optional
+
+from bot.constants import VIDEO_INDEX_PATH
+
+
+class VideoIndex:
+    """
+    An on-disk mapping of spotify track ids to the youtube video that was
+    chosen for them, so a track only ever needs to be searched for once.
+
+    The index is shared by every guild and is accessed from executor threads.
+    """
+
+    def __init__(self, location: str) -> None:
+        directory = path.dirname(location)
+        if directory:
+            makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._db = sqlite3.connect(location, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            "spotify_id TEXT PRIMARY KEY, video_id TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def get(self, spotify_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT video_id FROM videos WHERE spotify_id = ?", (spotify_id,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, spotify_id: str, video_id: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO videos VALUES (?, ?)", (spotify_id, video_id)
+            )
+            self._db.commit()
+
+    def forget(self, spotify_id: str):
+        """
+        Drops a mapping whose video is no longer available.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM videos WHERE spotify_id = ?", (spotify_id,))
+            self._db.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+VIDEO_INDEX = VideoIndex(VIDEO_INDEX_PATH)
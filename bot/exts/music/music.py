@@ -1,23 +1,50 @@
-import time
+import asyncio
 import discord
 import platform
-import datetime
 import random
 
 from discord.errors import ClientException
 from discord.member import Member
 from discord.utils import get as utils_get
-from typing import Dict, List, Any
+from typing import AsyncIterator, Collection, Dict, List, Optional, Tuple
 from discord.voice_client import VoiceClient
-from youtube_dl import YoutubeDL
 from discord import Guild
-from discord.commands import slash_command, Option
+from discord.commands import AutocompleteContext, slash_command, Option, OptionChoice
 from discord.ext import commands
-from spotipy.oauth2 import SpotifyClientCredentials
 from bot.exts.music.asyncspotify import AsyncSpotify
+from bot.exts.music.audiocache import AudioCache
+from bot.exts.music.cache import SEARCH_CACHE, SOURCE_CACHE, is_opus_source, source_expiry
+from bot.exts.music.sessions import SessionRegistry
+from bot.exts.music.snapshot import SessionSnapshots, SessionState
+from bot.exts.music.position import PositionTracker
+from bot.exts.music.queue import TrackRow
+from bot.constants import (
+    AUDIO_CACHE_DIRECTORY,
+    AUDIO_CACHE_ENABLED,
+    AUDIO_CACHE_MAX_MB,
+    IDLE_TIMEOUT,
+    PLAYBACK_MODE,
+    RECOMMENDER_MIN_POOL,
+    SEARCH_CACHE_MISS_TTL,
+    SEARCH_CACHE_TTL,
+    SEARCH_CONCURRENCY,
+    SEARCH_GLOBAL_CONCURRENCY,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_PATH,
+)
 from os import getenv
 
-from bot.exts.music.player import PlayStyle, Track, MusicSession, YDL_PRESET, TrackType
+from bot.exts.music.player import (
+    PlayStyle,
+    Track,
+    MusicSession,
+    YDL_PRESET,
+    TrackType,
+    TRACK_URLS,
+)
+from bot.exts.music.recommend import FEATURE_NAMES, FEATURE_POOL, TasteProfile
+from bot.exts.music.suggest import SUGGESTIONS
+from bot.utils.metrics import PLAY_LATENCY, SHARD_METRICS, FirstPacketProbe
 
 """
 By Ricky MY
@@ -60,6 +87,71 @@ def random_shift(value, max_shift=0.15, min_shift=-0.15):
     return max(0, min(value, 1))
 
 
+def target_features(vector: List[float]) -> Dict[str, float]:
+    """
+    Turns the features of a taste profile into randomly shifted
+    recommendation targets.
+    """
+    return {
+        f"target_{feature_name}": random_shift(value)
+        for feature_name, value in zip(FEATURE_NAMES, vector)
+    }
+
+
+# cached in place of the results of a search that found nothing
+NOT_FOUND = object()
+SEARCH_INFO_KEYS = ("id", "title", "thumbnail", "duration", "url")
+
+
+def normalize_query(item: str) -> str:
+    """
+    Folds the spellings of a search query that give the same results onto one
+    key, urls are only trimmed since video ids are case sensitive.
+    """
+    item = item.strip()
+    if item.startswith("https://"):
+        return item
+    return " ".join(item.casefold().split())
+
+
+def extract_yt(item: str) -> Optional[dict]:
+    """
+    Search a song with keywords on youtube, or extract a youtube url directly.
+    Returns None when nothing was found.
+    """
+    from youtube_dl import YoutubeDL
+    from youtube_dl.utils import DownloadError
+
+    print(f"[YouTube] Searching for {item}")
+    is_url = item.startswith("https://")
+    with YoutubeDL(YDL_PRESET) as ydl:
+        try:
+            info = ydl.extract_info(("ytsearch:" if not is_url else "") + item, download=False)
+        except DownloadError as e:
+            print(f"[YouTube] Nothing found for {item}: {e}")
+            return None
+    if not is_url:
+        if not info["entries"]:  # type: ignore
+            print(f"[YouTube] Nothing found for {item}")
+            return None
+        info = info["entries"][0]  # type: ignore
+    print(
+        f"[YouTube] Found results for {item}, fetching first response '{info['title']}'"  # type: ignore
+    )
+    return info  # type: ignore
+
+
+async def complete_track(ctx: AutocompleteContext) -> List[OptionChoice]:
+    """
+    Suggests tracks played before whose title or artists start like what has
+    been typed so far, answered from memory without any lookups.
+    """
+    return [
+        OptionChoice(name=suggestion.title[:100], value=suggestion.value)
+        for suggestion in SUGGESTIONS.complete(ctx.interaction.guild_id, ctx.value or "")
+    ]
+
+
 def in_channel(ctx):
     return ctx.channel.id == 702714945124696067
 
@@ -78,63 +170,189 @@ class Music(commands.Cog):
     def __init__(self, bot) -> None:
         self.bot = bot
 
-        self.queues: Dict[int, MusicSession] = {}
-
-        spotify_client_credentials_manager = SpotifyClientCredentials(
-            client_id=getenv("SPOTIFY_CLIENT_ID"),
-            client_secret=getenv("SPOTIFY_CLIENT_SECRET"),
+        self.queues = SessionRegistry(self.on_idle)
+        self.search_limit = asyncio.Semaphore(SEARCH_GLOBAL_CONCURRENCY)
+        self._searches: Dict[str, asyncio.Future] = {}  # normalized query -> extraction
+        self.audio_cache = (
+            AudioCache(
+                AUDIO_CACHE_DIRECTORY,
+                AUDIO_CACHE_MAX_MB * 1024 * 1024,
+                self.ffmpeg_executable,
+            )
+            if AUDIO_CACHE_ENABLED
+            else None
         )
 
         self.spotify = AsyncSpotify(
-            self.bot.loop, client_credentials_manager=spotify_client_credentials_manager
+            client_id=getenv("SPOTIFY_CLIENT_ID"),  # type: ignore
+            client_secret=getenv("SPOTIFY_CLIENT_SECRET"),  # type: ignore
         )
 
-    async def search_spotify(self, commander: Member, track: str) -> List[Track]:
-        queue: List[Dict[str, Any]]
+        self.snapshots = SessionSnapshots(SNAPSHOT_PATH)
+        self._snapshotter: Optional[asyncio.Task] = None
+        if self.bot.is_ready():
+            # reloaded while running, the sessions to restore are already gone
+            self._snapshotter = self.bot.loop.create_task(self.snapshot_periodically())
+
+    def cog_unload(self):
+        if self._snapshotter is not None:
+            self._snapshotter.cancel()
+        # the last snapshot is taken in place, the loop may not run again
+        for session in self.snapshot_sessions():
+            try:
+                self.snapshots.write(*self.snapshots.capture(session))
+            except Exception as e:
+                print(f"[{session.guild.name}] Snapshot failed: {e!r}")
+        self.snapshots.close()
+        self.queues.close()
+        if self.audio_cache:
+            self.audio_cache.close()
+        self.bot.loop.create_task(self.spotify.close())
+
+    async def iter_spotify(
+        self, commander: Member, track: str
+    ) -> AsyncIterator[Tuple[List[Track], int]]:
+        """
+        Yields the tracks behind a spotify link one page at a time, together
+        with the total amount of tracks behind the link.
+        """
         print(f"[Spotify] Fetching {track} items.")
         if track.startswith("https://open.spotify.com/playlist"):
-            queue = (await self.spotify.async_playlist_items(playlist_id=track))["items"]  # type: ignore
+            first = await self.spotify.playlist_items(track)
         elif track.startswith("https://open.spotify.com/album"):
-            queue = (await self.spotify.async_album_tracks(track))["items"]  # type: ignore
+            first = await self.spotify.album_tracks(track)
         else:
-            queue = [await self.spotify.async_track(track)]  # type: ignore
+            yield [Track.spotify(await self.spotify.track(track), commander)], 1
+            return
 
-        print(f"[Spotify] Fetched {len(queue)} from {track}.")
+        async for page in self.spotify.pages(first):
+            print(f"[Spotify] Fetched {len(page['items'])} from {track}.")
+            # playlist entries of deleted or local tracks come without a track
+            yield [
+                Track.spotify(item, commander)
+                for item in page["items"]
+                if item.get("track", item)
+            ], first["total"]
 
-        return [Track.spotify(track, commander) for track in queue]
+    async def search_spotify(self, commander: Member, track: str) -> List[Track]:
+        """
+        Fetches every track behind a spotify link.
+        """
+        queue: List[Track] = []
+        async for tracks, _ in self.iter_spotify(commander, track):
+            queue.extend(tracks)
+        return queue
 
-    async def search_yt(self, commander: Member, track_ids: List[str]) -> List[Track]:
+    async def append_pages(
+        self,
+        session: MusicSession,
+        pages: AsyncIterator[Tuple[List[Track], int]],
+        loaded: int,
+        total: int,
+    ):
         """
-        track_ids: List[str] - can be track name, youtube url, and spotify url
+        Appends the remaining pages of a spotify playlist or album to a session
+        in the background, keeping the controller informed of the progress.
         """
+        loader: asyncio.Task = asyncio.current_task()  # type: ignore
+        session.set_loading(loader, loaded, total)
+        try:
+            async for tracks, _ in pages:
+                session.add(*tracks)
+                loaded += len(tracks)
+                session.set_loading(loader, loaded, total)
+                self.resume_if_idle(session)
+                session.prefetch(self.spotify)
+                await session.update_controller()
+        finally:
+            session.done_loading(loader)
+        print(f"[{session.guild.name}] Finished loading {loaded} tracks.")
+        await session.update_controller()
 
-        def search_yt_inner() -> List[Track]:
-            """
-            Search a song with keywords on youtube and returns a list of track(s).
-            """
-            _ydl_preset = YDL_PRESET
-            queue = []
-            with YoutubeDL(_ydl_preset) as ydl:
-                for item in track_ids:
-                    print(f"[YouTube] Searching for {item}")
-                    is_url = item.startswith("https://")
-                    info = ydl.extract_info(("ytsearch:" if not is_url else "") + item, download=False)
-                    if not is_url:
-                        info = info["entries"][0]  # type: ignore
-                    queue.append(info)
-                    print(
-                        f"[YouTube] Found results for {item}, fetching first response '{info['title']}'"  # type: ignore
-                    )
+    async def iter_search_yt(
+        self, commander: Member, track_ids: List[str], concurrency: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, Track]]:
+        """
+        Resolves track_ids concurrently and yields every (position, track) pair
+        as soon as it is ready.
 
-            if not queue:
-                return []
+        concurrency: Optional[int] - lookups this call may run at once, they are
+                     additionally bounded by the bot-wide search limit
+        """
+        call_limit = asyncio.Semaphore(concurrency or SEARCH_CONCURRENCY)
 
-            # if its supposed to stem from externally obtained info
-            # returning in _source because `source` is a property and should not
-            # be messed with lol
-            return [Track.youtube(track, commander) for track in queue]
+        async def resolve(i: int, item: str) -> Tuple[int, Optional[dict]]:
+            async with call_limit, self.search_limit:
+                info = await self.cached_extract_yt(item)
+            return i, info
 
-        return await self.bot.loop.run_in_executor(None, search_yt_inner)
+        jobs = [
+            self.bot.loop.create_task(resolve(i, item))
+            for i, item in enumerate(track_ids)
+        ]
+        try:
+            for job in asyncio.as_completed(jobs):
+                i, info = await job
+                if info is not None:
+                    yield i, Track.youtube(info, commander)
+        finally:
+            # the consumer stopped early or a lookup failed
+            for job in jobs:
+                job.cancel()
+
+    async def search_yt(
+        self, commander: Member, track_ids: List[str], concurrency: Optional[int] = None
+    ) -> List[Track]:
+        """
+        track_ids: List[str] - can be track name, youtube url, and spotify url
+
+        The returned tracks keep the order of track_ids, the ones that weren't
+        found are left out.
+        """
+        queue: List[Optional[Track]] = [None] * len(track_ids)
+        async for i, track in self.iter_search_yt(commander, track_ids, concurrency):
+            queue[i] = track
+        return [track for track in queue if track is not None]
+
+    async def cached_extract_yt(self, item: str) -> Optional[dict]:
+        """
+        extract_yt behind the search cache, a query that found nothing is
+        remembered as well so it isn't searched for again right away.
+        """
+        key = normalize_query(item)
+        info = SEARCH_CACHE.get(key)
+        if info is not None:
+            print(f"[YouTube] Cached results for {item}")
+            if info is NOT_FOUND:
+                return None
+            if "url" in info and SOURCE_CACHE.is_stale(source_expiry(info["url"])):
+                # the video still stands, its stream url gets resolved again
+                info = {k: v for k, v in info.items() if k != "url"}
+            return info
+
+        # the same query searched for concurrently shares one extraction
+        search = self._searches.get(key)
+        if search is None:
+            search = self.bot.loop.run_in_executor(None, extract_yt, item)
+            self._searches[key] = search
+            search.add_done_callback(lambda done: self._on_searched(key, done))
+
+        # a cancelled caller mustn't cancel the search for everyone else
+        info = await asyncio.shield(search)
+        # only what a track is made from, the format lists are large
+        return info and {k: info[k] for k in SEARCH_INFO_KEYS if k in info}
+
+    def _on_searched(self, key: str, search: "asyncio.Future[Optional[dict]]"):
+        self._searches.pop(key, None)
+        if search.cancelled() or search.exception() is not None:
+            return
+
+        info = search.result()
+        if info is None:
+            SEARCH_CACHE.put(key, NOT_FOUND, SEARCH_CACHE_MISS_TTL)
+        else:
+            info = {k: info[k] for k in SEARCH_INFO_KEYS if k in info}
+            SEARCH_CACHE.put(key, info, SEARCH_CACHE_TTL)
 
     @slash_command(name="rewind")
     @commands.check(get_voice_checker())
@@ -172,7 +390,7 @@ class Music(commands.Cog):
             return
 
         if amount == 1:
-            session.now_playing.skipped = True
+            session.skip_current()
 
         try:
             session.move_track_index(amount)
@@ -197,10 +415,8 @@ class Music(commands.Cog):
             await ctx.respond("Seek ဖို့သီချင်းကအဲ့လောက်မရှည်ဘူးကွ။")
             return
 
-        start_at = session.now_duration + seconds
-        session._started_song_at -= datetime.timedelta(days=0, seconds=seconds)
-        session.start_track_at = start_at
-        session.is_controller_moved = True
+        # seeking backwards past the start restarts the track
+        session.seek(max(session.now_duration + seconds, 0))
 
         session.voice_client.stop()
 
@@ -209,15 +425,24 @@ class Music(commands.Cog):
     async def check_auto_queue(self, session: MusicSession):
         if session.is_auto_queue and session.at + 2 >= len(session.queue):
             print(
-                f"[{session.ctx.guild.name}] Currently at {session.at}/{len(session.queue)} so adding 3 recommendations."
+                f"[{session.guild.name}] Currently at {session.at}/{len(session.queue)} so adding 3 recommendations."
             )
 
+            await self.update_taste(session)
             session.add(
-                *(await self.get_recommendations(session.commander, session.queue))
+                *(
+                    await self.get_recommendations(
+                        session.commander,
+                        session.taste,
+                        exclude=session.queue.track_ids(),
+                    )
+                )
             )
+            self.resume_if_idle(session)
+            session.prefetch(self.spotify)
             await session.update_controller()
             print(
-                f"[{session.ctx.guild.name}] Added 3 recommendations, tracks totalling {len(session.queue)} now."
+                f"[{session.guild.name}] Added 3 recommendations, tracks totalling {len(session.queue)} now."
             )
 
     async def play_next(self, guild: Guild):
@@ -228,19 +453,14 @@ class Music(commands.Cog):
         if session is None:
             return
 
-        if not session.is_queue_remaining():
+        # a seek or a rewind replays from the controller even on the last track
+        if not session.is_controller_moved and not session.is_queue_remaining():
             # there are no more songs left to be played.
-            # we will wait 10 seconds to see if anything would be played
-            print("[Move] No tracks remaining, waiting 10 seconds to see if anything would be played")
-            time.sleep(10)
-
-            if not session.is_queue_remaining():
-                print(f"[Move] Job {guild.id} finished")
-                await session.disconnect()
-                if self.queues.get(guild.id) is not None:
-                    self.queues.pop(guild.id)
-            else:
-                await self.play_next(guild)
+            # the session idles for a while to see if anything would be played
+            print(
+                f"[Move] No tracks remaining, waiting {IDLE_TIMEOUT} seconds to see if anything would be played"
+            )
+            self.queues.arm_idle(guild.id, IDLE_TIMEOUT)
             return
 
         # there are still songs left to be played.
@@ -248,121 +468,385 @@ class Music(commands.Cog):
 
         # if the controller has been moved, we don't need to auto-move
         if not session.is_controller_moved:
+            session.finish_current()
             session.move_track_index(1)
         else:
             session.is_controller_moved = False
 
-        ffmpeg_pre = dict(self.ffmpeg_pre)
-        if session.start_track_at != 0:
-            start_track_at = time.strftime("%H:%M:%S", time.gmtime(session.start_track_at))
-            ffmpeg_pre["options"] = f"-vn -ss {start_track_at}"
-            session.start_track_at = 0
-
-        source = discord.PCMVolumeTransformer(
-            discord.FFmpegPCMAudio(
-                source=await self.bot.loop.run_in_executor(
-                    None, session.now_playing.get_source
-                ),
-                **self.ffmpeg_pre,
-                executable=self.ffmpeg_executable,
-            ),
-            volume=session.volume,
-        )
+        await session.wait_prefetch(session.now_playing)
+
+        start_at, session.start_track_at = session.start_track_at, 0
+        source = await self.create_source(session, start_at)
 
         try:
             session.voice_client.play(
                 source, after=lambda e: self.bot.loop.create_task(self.play_next(guild))
             )
         except ClientException:
-            if self.queues.get(guild.id) is not None:
-                self.queues.pop(guild.id)
+            self.queues.pop(guild.id)
 
             print(f"[Move] Job {guild.id} got forcefully closed")
             return
         else:
+            session.mark_started(source)
+            self.remember_play(session)
             print(
-                f"[Move] Now playing {session.now_playing.title} for job {session.guild.name} with the config as {ffmpeg_pre}."
+                f"[Move] Now playing {session.now_playing.title} for job {session.guild.name} from {start_at} seconds."
             )
 
-        upcoming = session.upcoming_track
-        if upcoming and upcoming.type is TrackType.SPOTIFY:
-            # prefetching upcoming track source & audio features
-            self.bot.loop.create_task(upcoming.load_all(self.spotify))
+        # prefetching the sources & audio features of the lookahead window
+        session.prefetch(self.spotify)
 
         self.bot.loop.create_task(self.check_auto_queue(session))
         self.bot.loop.create_task(session.update_controller())
 
+    async def create_source(
+        self, session: MusicSession, start_at: int = 0
+    ) -> PositionTracker:
+        """
+        Builds the audio source for the track that is now playing, served from
+        the local audio cache when the track has been cached before.
+
+        start_at: int - seconds into the track to start from, the seek happens
+                  on the input side so ffmpeg jumps there with a range request
+                  (or a seek in the cached file) instead of decoding the prefix
+        """
+        track = session.now_playing
+        ffmpeg_pre = dict(self.ffmpeg_pre)
+        location = self.audio_cache.get(track.id) if self.audio_cache else None
+        if location is not None:
+            print(f"[AudioCache] Playing {track.title} from the disk.")
+            # the reconnect flags only apply to network streams
+            ffmpeg_pre["before_options"] = ""
+            is_opus = True  # the cache only holds ogg/opus files
+        else:
+            with PLAY_LATENCY.time("get_source", session.guild.id):
+                location = await self.bot.loop.run_in_executor(None, track.get_source)
+            if self.audio_cache:
+                self.audio_cache.note_play(
+                    track.id,
+                    session.style in (PlayStyle.LOOP_TRACK, PlayStyle.LOOP_QUEUE),
+                    location,
+                )
+            is_opus = is_opus_source(location)
+
+        if start_at:
+            ffmpeg_pre["before_options"] = f"-ss {start_at} {ffmpeg_pre['before_options']}"
+
+        with PLAY_LATENCY.time("ffmpeg_spawn", session.guild.id):
+            if PLAYBACK_MODE == "opus":
+                source = self.create_opus_source(
+                    location, ffmpeg_pre, session.volume, is_opus
+                )
+            else:
+                source = discord.PCMVolumeTransformer(
+                    discord.FFmpegPCMAudio(
+                        source=location,
+                        **ffmpeg_pre,
+                        executable=self.ffmpeg_executable,
+                    ),
+                    volume=session.volume,
+                )
+        return PositionTracker(
+            FirstPacketProbe(source, session.guild.id), start_at, session.guild.shard_id
+        )
+
+    def create_opus_source(
+        self, location: str, ffmpeg_pre: Dict[str, str], volume: float, is_opus: bool
+    ) -> discord.AudioSource:
+        """
+        Builds a source that hands opus packets straight to the voice client,
+        opus input is copied through untouched and anything else is encoded by
+        ffmpeg, with the volume applied as an ffmpeg filter.
+        """
+        # a volume of 0.5 is displayed as 100%
+        gain = round(volume * 2, 2)
+        if gain == 1 and is_opus:
+            # FFmpegOpusAudio copies the stream for an "opus" codec and
+            # encodes with libopus for anything else
+            return discord.FFmpegOpusAudio(
+                location,
+                bitrate=128,
+                codec="opus",
+                executable=self.ffmpeg_executable,
+                before_options=ffmpeg_pre["before_options"],
+                options=ffmpeg_pre["options"],
+            )
+
+        return discord.FFmpegOpusAudio(
+            location,
+            bitrate=128,
+            executable=self.ffmpeg_executable,
+            before_options=ffmpeg_pre["before_options"],
+            options=f"{ffmpeg_pre['options']} -af volume={gain}",
+        )
+
+    async def on_idle(self, guild_id: int):
+        """
+        Disconnects a session that sat at the end of its queue for too long.
+        """
+        session = self.queues.get(guild_id)
+        if session is None:
+            return
+
+        shard = self.queues.shard_of(guild_id)
+        if shard is not None and not shard.connected:
+            # the gateway is reconnecting, the session is kept until it's back
+            self.queues.arm_idle(guild_id, IDLE_TIMEOUT)
+            return
+
+        print(f"[Move] Job {guild_id} finished")
+        await session.disconnect()
+        self.queues.pop(guild_id)
+        await self.forget_snapshot(guild_id)
+
+    def resume_if_idle(self, session: MusicSession):
+        """
+        Carries on playing an idling session once it has something left to play.
+        """
+        if self.queues.is_idle(session.guild.id) and session.is_queue_remaining():
+            self.queues.cancel_idle(session.guild.id)
+            self.bot.loop.create_task(self.play_next(session.guild))
+
     async def start_queue(self, guild: Guild):
         """
         Start queue function that mitigates voice channel and plays the
         first song in queue followed by the move queue function
         """
-        session: MusicSession = self.queues[guild.id]
-        source = discord.PCMVolumeTransformer(
-            discord.FFmpegPCMAudio(
-                source=await self.bot.loop.run_in_executor(
-                    None, session.now_playing.get_source
-                ),
-                **self.ffmpeg_pre,
-                executable=self.ffmpeg_executable,
-            ),
-            volume=session.volume,
-        )
-        session.start_queue()
+        session: MusicSession = self.queues.get(guild.id)  # type: ignore
+        start_at, session.start_track_at = session.start_track_at, 0
+        source = await self.create_source(session, start_at)
+        session.start_queue(source)
         session.voice_client.play(
             source, after=lambda e: self.bot.loop.create_task(self.play_next(guild))
         )
+        self.remember_play(session)
         print(f"[Start] Now playing {session.now_playing.title} for job {guild.name}")
 
-    async def get_recommendations(
-        self, commander: Member, tracks: List[Track], limit=3
-    ) -> List[Track]:
-        if not tracks:
-            return []
+        session.prefetch(self.spotify)
+
+    def remember_play(self, session: MusicSession):
+        """
+        Offers the track that just started as a /play suggestion, picking a
+        youtube suggestion is served from the search cache as well.
+        """
+        track = session.now_playing
+        if track.type is TrackType.YOUTUBE:
+            value = f"https://www.youtube.com/watch?v={track.id}"
+            info = {
+                "id": track.id,
+                "title": track.title,
+                "thumbnail": track.thumbnail,
+                "duration": track.duration,
+            }
+            source = SOURCE_CACHE.get(track.id)
+            if source is not None:
+                info["url"] = source
+            SEARCH_CACHE.put(normalize_query(value), info, SEARCH_CACHE_TTL)
+        elif (
+            track.type is TrackType.SPOTIFY
+            and track.url == TRACK_URLS[TrackType.SPOTIFY] + track.id
+        ):
+            value = track.url
+        else:
+            # raw tracks pass as spotify ones but their id is only a hash
+            return
+        SUGGESTIONS.record(session.guild.id, track.title, track.artists, value)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self._snapshotter is not None:
+            # on_ready fires again after the gateway reconnects
+            return
+        self._snapshotter = self.bot.loop.create_task(self.snapshot_periodically())
+        snapshots = await self.bot.loop.run_in_executor(None, self.snapshots.load)
+        for state, rows in snapshots:
+            await self.restore_session(state, rows)
 
-        if len(tracks) > 100:
-            # get the first 100 unique tracks
-            tracks = list(set(tracks[:100]))
+    def snapshot_sessions(self) -> List[MusicSession]:
+        """
+        Sessions worth resuming, the ones waiting to time out at the end of
+        their queue are left out.
+        """
+        return [
+            session
+            for session in self.queues
+            if session.voice_client is not None
+            and not self.queues.is_idle(session.guild.id)
+        ]
+
+    async def snapshot_periodically(self):
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            await self.save_snapshots()
+
+    async def save_snapshots(self):
+        sessions = self.snapshot_sessions()
+        active = {session.guild.id for session in sessions}
+        for guild_id in self.snapshots.saved_guilds():
+            if guild_id not in active:
+                await self.forget_snapshot(guild_id)
+
+        for session in sessions:
+            try:
+                state, start, rows = self.snapshots.capture(session)
+                await self.bot.loop.run_in_executor(
+                    None, self.snapshots.write, state, start, rows
+                )
+            except Exception as e:
+                print(f"[{session.guild.name}] Snapshot failed: {e!r}")
+                self.snapshots.invalidate(session.guild.id)
+                continue
+            if self.queues.get(session.guild.id) is not session:
+                # the session ended while its snapshot was being written
+                await self.forget_snapshot(session.guild.id)
+
+    async def forget_snapshot(self, guild_id: int):
+        """
+        Drops the snapshot of a session that ended so a restart doesn't bring
+        it back.
+        """
+        await self.bot.loop.run_in_executor(None, self.snapshots.forget, guild_id)
 
-        tracks_info = {
-            track.id: await track.get_audio_features(self.spotify)
-            for track in tracks
-            if track.type is TrackType.SPOTIFY and not track.skipped
-        }
+    async def restore_session(self, state: SessionState, rows: List[TrackRow]):
+        """
+        Rejoins the voice channel of a saved session and carries on playing
+        from where the snapshot left off.
+        """
+        guild = self.bot.get_guild(state.guild_id)
+        voice_channel = guild and guild.get_channel(state.voice_channel_id)
+        cmd_channel = guild and guild.get_channel(state.cmd_channel_id)
+        if (
+            guild is None
+            or voice_channel is None
+            or cmd_channel is None
+            or not rows
+            or guild.id in self.queues
+        ):
+            await self.forget_snapshot(state.guild_id)
+            return
 
+        # stream urls that are still valid spare the tracks a fresh lookup
+        for track_id, source in state.sources.items():
+            SOURCE_CACHE.put(track_id, source)
+
+        session = MusicSession(
+            [Track.from_row(row) for row in rows],
+            guild,
+            voice_channel,
+            cmd_channel,
+            guild.get_member(state.commander_id) or guild.me,
+            state.auto_queue,
+        )
+        session.at = min(state.at, len(session.queue) - 1)
+        session.style = PlayStyle[state.style]
+        session.volume = state.volume
+        session.start_track_at = state.position
         print(
-            f"[Spotify] Getting recommendations for auto-queue based on {len(tracks_info)} tracks."
+            f"[{guild.name}] Restoring session with {len(rows)} tracks at track {session.at}, {state.position} seconds in."
         )
 
-        # Get the average audio features of the tracks in the playlist
-        target_features = {}
-
-        # all supported features for recommendations are set here
-        for feature_name in [
-            "danceability",
-            "energy",
-            "valence",
-            "instrumentalness",
-        ]:
-            target_features[f"target_{feature_name}"] = random_shift(
-                sum([track[feature_name] for track in tracks_info.values()])
-                / len(tracks_info)
-            )
+        try:
+            await session.ensure_voice_connection()
+            self.queues.add(session)
+            await self.start_queue(guild)
+            if state.paused:
+                session.pause()
+
+            embed = session.get_queue_embed()
+            session.controller = await cmd_channel.send(embed=embed)
+            session.renderer.remember(embed)
+        except Exception as e:
+            print(f"[{guild.name}] Failed to restore session: {e!r}")
+            if session.voice_client is not None:
+                await session.disconnect()
+            self.queues.pop(guild.id)
+            await self.forget_snapshot(state.guild_id)
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id: int):
+        print(f"[Shard {shard_id}] Gateway disconnected, holding its sessions.")
+        self.queues.shard(shard_id).connected = False
+        SHARD_METRICS.inc("disconnects", shard_id)
+        SHARD_METRICS.set("connected", shard_id, 0)
+
+    @commands.Cog.listener()
+    async def on_shard_resumed(self, shard_id: int):
+        print(f"[Shard {shard_id}] Gateway resumed.")
+        SHARD_METRICS.inc("resumes", shard_id)
+        self.on_shard_connected(shard_id)
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id: int):
+        self.on_shard_connected(shard_id)
+
+    def on_shard_connected(self, shard_id: int):
+        """
+        Carries on the sessions of a shard that held them through a reconnect.
+        """
+        shard = self.queues.shard(shard_id)
+        shard.connected = True
+        SHARD_METRICS.set("connected", shard_id, 1)
+        for session in list(shard.sessions.values()):
+            self.resume_if_idle(session)
 
+    async def update_taste(self, session: MusicSession):
+        """
+        Loads the audio features of the tracks the session heard before they
+        were loaded, so they count towards its taste.
+        """
+        tracks = session.unprofiled_tracks
+        if tracks:
+            await Track.load_many_audio_features(self.spotify, tracks)
+            session.profile_loaded(tracks)
+
+    async def get_recommendations(
+        self,
+        commander: Member,
+        taste: TasteProfile,
+        limit=3,
+        exclude: Collection[str] = (),
+    ) -> List[Track]:
+        """
+        taste: TasteProfile - the audio features to recommend tracks near
+        exclude: Collection[str] - ids of tracks that mustn't be recommended on
+                 top of the seeds, usually the whole queue
+        """
+        vector = taste.vector()
+        if vector is None:
+            return []
+
+        features = target_features(vector)
         print(
-            f"[Spotify] Generated average audio features based '{', '.join(target_features.keys())}' on the tracks."
+            f"[Spotify] Getting recommendations for auto-queue based on '{', '.join(features.keys())}'."
+        )
+
+        # the tracks the bot has seen before are searched first, spotify is
+        # only asked once there are too few of them left to pick from
+        local = FEATURE_POOL.nearest(
+            [features[f"target_{name}"] for name in FEATURE_NAMES],
+            limit,
+            {*exclude, *taste.seeds},
+            min_pool=RECOMMENDER_MIN_POOL,
         )
+        if local is not None:
+            print(f"[Recommender] Recommending {len(local)} pooled tracks as auto-queue.")
+            recommended = [Track.from_row(row) for row in local]
+            for track in recommended:
+                track.commander_id = commander.id
+                track.auto_queued = True
+            return recommended
 
-        # 5 random track ids from the playlist
-        seed_tracks = random.sample(tracks_info.keys(), min(5, len(tracks_info)))
+        # the most recently liked tracks
+        seed_tracks = list(taste.seeds)
 
         # Get the recommended tracks based on the average audio features
         queue = (
-            await self.spotify.async_recommendations(  # type: ignore
-                seed_tracks=seed_tracks, limit=limit, **target_features
+            await self.spotify.recommendations(
+                seed_tracks=seed_tracks, limit=limit, **features
             )
         )["tracks"]
-        print(seed_tracks, target_features)
+        print(seed_tracks, features)
         # Generate song recommendations based on the average audio features of the tracks in the playlist
         print(f"[Spotify] Recommending {len(queue)} tracks as auto-queue.")
 
@@ -370,22 +854,39 @@ class Music(commands.Cog):
 
     @slash_command(name="play")
     @commands.check(get_voice_checker(within_same_channel=False, connection=False))
-    async def play(self, ctx, *, track: Option(str, description="သံစဉ်အမည် သို့မဟုတ် သံစဉ်လင့်ခ်က်"), auto_queue: Option(bool, description="Spotify Playlist သံစဉ်များအရ စက်စပ် တီးဆိုခြင်း။", default=False)):  # type: ignore
+    async def play(self, ctx, *, track: Option(str, description="သံစဉ်အမည် သို့မဟုတ် သံစဉ်လင့်ခ်က်", autocomplete=complete_track), auto_queue: Option(bool, description="Spotify Playlist သံစဉ်များအရ စက်စပ် တီးဆိုခြင်း။", default=False)):  # type: ignore
         """
         ကွီးရဲ့သံစဉ်နားထောင်ရန်
         """
         print(f"[{ctx.guild.name}] {ctx.author.name} is playing {track}")
         await ctx.defer()
+        pages = None
+        total = 0
+        taste: Optional[TasteProfile] = None  # of a playlist only used for auto-queue
         if track.startswith("raw:"):
             prelude = [Track.raw(track, ctx.author)]
         elif track.startswith("https://open.spotify.com/"):
-            prelude = await self.search_spotify(ctx.author, track)
+            # only the first page is waited for, the rest is appended later
+            pages = self.iter_spotify(ctx.author, track)
+            with PLAY_LATENCY.time("search", ctx.guild.id):
+                prelude, total = await pages.__anext__()
             # playlist tracks on auto-queue generate recommendations instantly
             if auto_queue and len(prelude) > 1:
-                prelude = await self.get_recommendations(ctx.author, prelude)
+                await pages.aclose()
+                pages = None
+                taste = TasteProfile()
+                await Track.load_many_audio_features(self.spotify, prelude[:100])
+                for playlist_track in prelude[:100]:
+                    if playlist_track.audio_features is not None:
+                        taste.update(playlist_track.id, playlist_track.audio_features, 1.0)
+                prelude = await self.get_recommendations(
+                    ctx.author, taste, exclude={playlist_track.id for playlist_track in prelude}
+                )
 
             # load the first track in the playlist
-            await prelude[0].load_all(self.spotify)
+            if prelude:
+                with PLAY_LATENCY.time("load_all", ctx.guild.id):
+                    await prelude[0].load_all(self.spotify)
         else:
             if track.startswith("https"):
                 if not any(
@@ -397,7 +898,8 @@ class Music(commands.Cog):
                     )
                     return
 
-            prelude = await self.search_yt(ctx.author, [track])
+            with PLAY_LATENCY.time("search", ctx.guild.id):
+                prelude = await self.search_yt(ctx.author, [track])
 
         if not prelude:
             await ctx.respond(f"ရှာမတွေ့ဘူး `{track}` အတွက်။")
@@ -408,20 +910,28 @@ class Music(commands.Cog):
             print(
                 f"[{ctx.guild.name}] Started session with {len(prelude)} tracks, auto_queue: {auto_queue}."
             )
-            session = MusicSession(prelude, ctx, auto_queue)
+            session = MusicSession.from_context(prelude, ctx, auto_queue)
+            if taste is not None:
+                session.taste.merge(taste)
             await session.ensure_voice_connection()
 
-            self.queues[ctx.guild.id] = session
+            self.queues.add(session)
             await self.start_queue(ctx.guild)
         else:
             print(
                 f"[{ctx.guild.name}] Music session updated with {len(prelude)} tracks with."
             )
-            self.queues[ctx.guild.id].add(*prelude)
-            session = self.queues[ctx.guild.id]
+            session = queue
+            if taste is not None:
+                session.taste.merge(taste)
+            session.add(*prelude)
+            self.resume_if_idle(session)
+            session.prefetch(self.spotify)
 
         if session.controller is None:
-            session.controller = await ctx.respond(embed=session.get_queue_embed())
+            embed = session.get_queue_embed()
+            session.controller = await ctx.respond(embed=embed)
+            session.renderer.remember(embed)
         else:
             await session.update_controller()
             await ctx.respond(
@@ -431,6 +941,11 @@ class Music(commands.Cog):
                 )
             )
 
+        if pages is not None and len(prelude) < total:
+            self.bot.loop.create_task(
+                self.append_pages(session, pages, len(prelude), total)
+            )
+
         # setup session with a recommendation based queue if it's not a playlist
         if auto_queue and len(prelude) == 1:
             print("[Spotify] Starting auto-queue mode. Getting recommendations.")
@@ -449,6 +964,7 @@ class Music(commands.Cog):
 
         embed = session.get_queue_embed()
         session.controller = await ctx.respond(embed=embed)
+        session.renderer.remember(embed)
 
     @slash_command(name="mode")
     @commands.check(get_voice_checker())
@@ -472,6 +988,8 @@ class Music(commands.Cog):
             )
         else:
             session.style = mode
+            self.resume_if_idle(session)
+            session.prefetch(self.spotify)
             await ctx.respond(f"သံစဥ်ကို {session.style.value} ပြောင်းပြီးပါပြီး။")
         await session.update_controller()
 
@@ -486,8 +1004,21 @@ class Music(commands.Cog):
             await ctx.respond("ငါ့မှာသိမ်းစရာမရှိပါ။")
             return
 
+        commander_id = session.now_playing.commander_id
+        commander = ctx.guild.get_member(commander_id)
+        if commander is None:
+            # the members intent is off, so the cache rarely has the requester
+            try:
+                commander = await ctx.guild.fetch_member(commander_id)
+            except discord.errors.HTTPException:
+                pass
+        requested_by = (
+            f"`{commander.name}#{commander.discriminator}`"
+            if commander is not None
+            else f"<@{commander_id}>"
+        )
         embed = discord.Embed(
-            description=f"⏲️ Duration: `{':'.join(session.format_duration(session.now_playing.duration))}`\n📡 Requested By: `{session.now_playing.commander.name}#{session.now_playing.commander.discriminator}`",
+            description=f"⏲️ Duration: `{':'.join(session.format_duration(session.now_playing.duration))}`\n📡 Requested By: {requested_by}",
             color=0xFFD983,
         )
         embed.set_thumbnail(
@@ -517,11 +1048,10 @@ class Music(commands.Cog):
         else:
             await ctx.respond("ဘိုင်းဘိုင်း ငမွှထိုး။")
 
+        self.queues.cancel_idle(ctx.guild.id)
         await session.disconnect()
-        try:
-            self.queues.pop(ctx.guild.id)
-        except KeyError:
-            pass
+        self.queues.pop(ctx.guild.id)
+        await self.forget_snapshot(ctx.guild.id)
 
     @slash_command(name="pause")
     @commands.check(get_voice_checker())
@@ -1,22 +1,37 @@
-import random
+import asyncio
 
-from datetime import datetime
-from youtube_dl import YoutubeDL
+from collections import deque
 from discord.channel import TextChannel, VoiceChannel
 from discord.commands import ApplicationContext
 from discord.guild import Guild
 from discord import Embed, VoiceClient
-from discord.webhook import WebhookMessage
+from discord.message import Message
 from discord.interactions import Interaction
 from discord.member import Member
 
 from enum import Enum
 
 from dataclasses import dataclass, field
-from typing import List, Optional, Union
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple, Union
+
+from bot.constants import LOOKAHEAD, TASTE_FINISH_WEIGHT, TASTE_SKIP_WEIGHT
+from bot.exts.music.cache import AUDIO_FEATURES, SOURCE_CACHE
+from bot.exts.music.index import VIDEO_INDEX
+from bot.exts.music.position import PositionTracker
+from bot.exts.music.queue import AUTO_QUEUED, SKIPPED, QueueView, TrackQueue, TrackRow
+from bot.exts.music.recommend import FEATURE_POOL, TasteProfile
+from bot.exts.music.render import ControllerRenderer
+from bot.exts.music.shuffle import ShuffleOrder
+from bot.utils.metrics import PLAY_LATENCY
+
+if TYPE_CHECKING:
+    from youtube_dl import YoutubeDL
 
 SEEK = 0x6335
 
+# the most ids spotify accepts on the audio-features endpoint
+AUDIO_FEATURES_BATCH = 100
+
 YDL_PRESET = {
     "format": "bestaudio",
     "restrictfilenames": True,
@@ -46,6 +61,12 @@ class TrackType(Enum):
     SPOTIFY = "spotify"
 
 
+TRACK_TYPES = list(TrackType)
+TRACK_URLS = {
+    TrackType.YOUTUBE: "https://www.youtu.be/",
+    TrackType.SPOTIFY: "https://open.spotify.com/track/",
+}
+
 @dataclass
 class Track:
     title: str
@@ -54,7 +75,7 @@ class Track:
     url: str
     duration: int
     type: TrackType
-    commander: Member
+    commander_id: int
     auto_queued: bool = False
     artists: List[str] = field(default_factory=list)
     _source: Optional[str] = None  # to pass in a predefined source
@@ -63,13 +84,23 @@ class Track:
     )
     _is_skipped = False
 
+    def __post_init__(self):
+        if self._source is not None:
+            SOURCE_CACHE.put(self.id, self._source)
+
     def __hash__(self) -> int:
         return hash(self.id)
 
     def get_source(self) -> str:
-        if self._source is None:
+        """
+        Returns a stream url for the track, it is only resolved again when the
+        cached one has expired or got evicted.
+        """
+        source = SOURCE_CACHE.get(self.id)
+        if source is None:
             self.load_source()
-        return self._source  # type: ignore
+            source = self._source
+        return source  # type: ignore
 
     @property
     def skipped(self):
@@ -88,6 +119,13 @@ class Track:
             await self.load_audio_features(spotify_api)
         return self._audio_features  # type: ignore
 
+    @property
+    def audio_features(self) -> Optional[dict]:
+        """
+        The audio features if they have already been loaded.
+        """
+        return self._audio_features
+
     @staticmethod
     def raw(source: str, commander: Member, **kwargs):
         _, title, *url = source.split(":")
@@ -100,7 +138,7 @@ class Track:
             duration=0,
             type=TrackType.SPOTIFY,
             id=str(hash(url)),
-            commander=commander,
+            commander_id=commander.id,
             **kwargs,
         )
 
@@ -110,45 +148,154 @@ class Track:
         # normal track objects do.
         info = track.get("track", track)
         artists = [artist["name"] for artist in info["artists"]]
+        # album track listings come without the album itself
+        images = info.get("album", {}).get("images") or [{"url": "https://google.com/"}]
         return Track(
             title=f"{info['name']} - {', '.join(artists) if artists else ''}",
             artists=artists,
             url=info["external_urls"]["spotify"],
-            thumbnail=info["album"]["images"][0]["url"],
+            thumbnail=images[0]["url"],
             duration=info["duration_ms"] // 1000,
             type=TrackType.SPOTIFY,
             id=info["id"],
-            commander=commander,
+            commander_id=commander.id,
             **kwargs,
         )
 
     @property
     def requested_by(self) -> str:
-        return "ကွီးရွေးထားသည်။" if self.auto_queued else self.commander.mention
+        return "ကွီးရွေးထားသည်။" if self.auto_queued else f"<@{self.commander_id}>"
+
+    def to_row(self) -> TrackRow:
+        """
+        Flattens the track into the plain values a `TrackQueue` stores.
+        """
+        url = None if self.url == TRACK_URLS.get(self.type, "") + self.id else self.url
+        flags = (AUTO_QUEUED if self.auto_queued else 0) | (SKIPPED if self.skipped else 0)
+        return (
+            self.id,
+            self.title,
+            tuple(self.artists),
+            url,
+            self.thumbnail,
+            self.duration,
+            TRACK_TYPES.index(self.type),
+            self.commander_id,
+            flags,
+        )
+
+    @staticmethod
+    def from_row(row: TrackRow) -> "Track":
+        track_id, title, artists, url, thumbnail, duration, type_code, commander_id, flags = row
+        track_type = TRACK_TYPES[type_code]
+        track = Track(
+            title=title,
+            id=track_id,
+            thumbnail=thumbnail,
+            url=url or TRACK_URLS[track_type] + track_id,
+            duration=duration,
+            type=track_type,
+            commander_id=commander_id,
+            auto_queued=bool(flags & AUTO_QUEUED),
+            artists=list(artists),
+        )
+        track.skipped = bool(flags & SKIPPED)
+        return track
 
     def load_source(self):
-        print(f"[YouTube] Getting source for a spotify track {self.title}.")
+        # youtube_dl registers hundreds of extractors on import, it is only
+        # paid for once the first source gets resolved
+        from youtube_dl import YoutubeDL
+
         if self.type is TrackType.SPOTIFY:
+            print(f"[YouTube] Getting source for a spotify track {self.title}.")
+            with YoutubeDL(YDL_PRESET) as ydl:
+                info = self.extract_indexed(ydl)
+                if info is None:
+                    info = ydl.extract_info(  # type: ignore
+                        f"ytsearch:{self.title}",
+                        download=False,
+                    )["entries"][0]
+                    VIDEO_INDEX.put(self.id, info["id"])
+            print(f"[YouTube] Found YouTube video {info['title']}.")
+        elif self.type is TrackType.YOUTUBE:
+            print(f"[YouTube] Refreshing expired source for {self.title}.")
             with YoutubeDL(YDL_PRESET) as ydl:
                 info = ydl.extract_info(  # type: ignore
-                    f"ytsearch:{self.title}",
+                    f"https://www.youtube.com/watch?v={self.id}",
                     download=False,
-                )["entries"][0]
-            print(f"[YouTube] Found YouTube video {info['title']}.")
-            self._source = info["url"]
+                )
         else:
             raise Exception(f"Unrecoginized {self.type} to get source from.")
+        self._source = info["url"]  # type: ignore
+        SOURCE_CACHE.put(self.id, self._source)
+
+    def extract_indexed(self, ydl: "YoutubeDL") -> Optional[dict]:
+        """
+        Extracts the youtube video previously chosen for this spotify track
+        directly, skipping the search step.
+        """
+        from youtube_dl.utils import DownloadError
+
+        video_id = VIDEO_INDEX.get(self.id)
+        if video_id is None:
+            return None
+
+        print(
+            f"[YouTube] Indexed video {video_id} for {self.title} "
+            f"({VIDEO_INDEX.hits} hits, {VIDEO_INDEX.misses} misses)."
+        )
+        try:
+            return ydl.extract_info(  # type: ignore
+                f"https://www.youtube.com/watch?v={video_id}",
+                download=False,
+            )
+        except DownloadError:
+            # the video got taken down or blocked, search for a new one
+            VIDEO_INDEX.forget(self.id)
+            return None
 
     async def load_audio_features(self, spotify_api):
         if self.type is TrackType.SPOTIFY and self._audio_features is None:
-            self._audio_features = await spotify_api.async__get(f"audio-features/{self.id}")  # type: ignore
+            await Track.load_many_audio_features(spotify_api, [self])
+
+    @staticmethod
+    async def load_many_audio_features(spotify_api, tracks: List["Track"]):
+        """
+        Loads the audio features of many spotify tracks with as few requests as
+        possible, features that were seen before are served from the local cache.
+        """
+        missing: Dict[str, List[Track]] = {}
+        for track in tracks:
+            if track.type is not TrackType.SPOTIFY or track._audio_features is not None:
+                continue
+            features = AUDIO_FEATURES.get(track.id)
+            if features is None:
+                missing.setdefault(track.id, []).append(track)
+            else:
+                track._audio_features = features
+                FEATURE_POOL.add(track, features)
+
+        track_ids = list(missing)
+        for i in range(0, len(track_ids), AUDIO_FEATURES_BATCH):
+            batch = track_ids[i : i + AUDIO_FEATURES_BATCH]
+            print(f"[Spotify] Fetching audio features for {len(batch)} tracks.")
+            results = await spotify_api.audio_features(batch)
+            for track_id, features in zip(batch, results):
+                # spotify answers null for tracks it has no analysis for
+                if features is None:
+                    continue
+                AUDIO_FEATURES.put(track_id, features)
+                FEATURE_POOL.add(missing[track_id][0], features)
+                for track in missing[track_id]:
+                    track._audio_features = features
 
     async def load_all(self, spotify_api):
         """
         Non YouTube tracks need source and audio_features to be loaded before playing.
         """
         await self.load_audio_features(spotify_api)
-        self.load_source()
+        await asyncio.get_running_loop().run_in_executor(None, self.get_source)
 
     @staticmethod
     def youtube(track: dict, commander: Member, **kwargs):
@@ -160,65 +307,101 @@ class Track:
             or "https://www.freeiconspng.com/thumbs/youtube-logo-png/hd-youtube-logo-png-transparent-background-20.png",
             duration=round(track.get("duration", 0)),
             type=TrackType.YOUTUBE,
-            commander=commander,
-            _source=str(track.get("url")),
+            commander_id=commander.id,
+            _source=track.get("url"),
             **kwargs,
         )
 
 
 class MusicSession:
     def __init__(
-        self, queue: List[Track], ctx: ApplicationContext, auto_queue: bool
+        self,
+        queue: List[Track],
+        guild: Guild,
+        voice_channel: VoiceChannel,
+        cmd_channel: TextChannel,
+        commander: Member,
+        auto_queue: bool,
     ) -> None:
-        self.queue = queue
+        self.queue = TrackQueue(Track.from_row, queue)
         self.is_auto_queue = auto_queue
-        self.ctx = ctx
 
         self.at: int = 0
         self.start_track_at = 0
-        self.voice_channel: VoiceChannel = ctx.author.voice.channel
-        self.guild: Guild = ctx.guild
-        self.cmd_channel: TextChannel = ctx.channel
-        self.commander: Member = ctx.author
+        self.voice_channel = voice_channel
+        self.guild = guild
+        self.cmd_channel = cmd_channel
+        self.commander = commander
         self.volume = 0.5
-        self.controller: Optional[Union[WebhookMessage, Interaction]] = None
+        self.controller: Optional[Union[Message, Interaction]] = None
+        self.renderer = ControllerRenderer(self)
         self.is_controller_moved = False  # if there has been a skip or a rewind
+        self.lookahead = LOOKAHEAD  # how many upcoming tracks get prefetched
 
         self._voice_client = None
         self._play_style: PlayStyle = PlayStyle.NORMAL
-        self._started_song_at: datetime = None  # type: ignore
-        self._last_paused = None
+        self.playback: Optional[PositionTracker] = None  # source of the track playing
+        # (queue, queue version, at, track) of the last now_playing lookup
+        self._now_playing: Optional[Tuple[TrackQueue, int, int, Track]] = None
+        self._shuffle = ShuffleOrder()  # only kept up to date while shuffling
+        self._prefetches: Dict[str, asyncio.Task] = {}
+        self._loading: Dict[asyncio.Task, Tuple[int, int]] = {}  # loader -> (loaded, total)
+
+        self.taste = TasteProfile()
+        # tracks heard of before their audio features were loaded, with their
+        # weight. Past a batch the oldest are dropped, by the time a batch of
+        # newer tracks is counted the decay leaves them hardly any weight
+        self._unprofiled: Deque[Tuple[Track, float]] = deque(maxlen=AUDIO_FEATURES_BATCH)
+        for track in queue:
+            if not track.auto_queued:
+                self.observe(track)
+
+    @classmethod
+    def from_context(
+        cls, queue: List[Track], ctx: ApplicationContext, auto_queue: bool
+    ) -> "MusicSession":
+        """
+        Starts a session in the voice channel of whoever invoked the command.
+        """
+        return cls(
+            queue, ctx.guild, ctx.author.voice.channel, ctx.channel, ctx.author, auto_queue
+        )
 
     @property
     def now_duration(self) -> int:
         """
-        Returns the amount of time in seconds since
-        a song started playing
+        Returns how many seconds into the playing track the voice client is
         """
-        time_taken = datetime.utcnow() - self._started_song_at
-        if self._last_paused is not None:
-            time_taken -= datetime.utcnow() - self._last_paused
-
-        return time_taken.seconds
+        if self.playback is None:
+            return 0
+        return int(self.playback.position)
 
     @property
     def now_playing(self) -> Track:
         """
-        Returns the track that is first in queue
+        Returns the track that is first in queue, materialized once for as
+        long as the queue around it doesn't change
         """
-        return self.queue[self.at]
+        cached = self._now_playing
+        if (
+            cached is None
+            or cached[0] is not self.queue
+            or cached[1] != self.queue.version
+            or cached[2] != self.at
+        ):
+            track = self.queue[self.at]
+            cached = self._now_playing = (self.queue, self.queue.version, self.at, track)
+        return cached[3]
 
     @property
     def upcoming_track(self) -> Optional[Track]:
         """
-        Returns the track that is second in queue
+        Returns the track that is going to be played next
         """
-        if self._play_style is PlayStyle.NORMAL:
-            if self.at + 1 >= len(self.queue):
-                return None
-            return self.queue[self.at + 1]
-        else:
-            return self.queue[self.at]
+        upcoming = self.upcoming_indices(1)
+        if not upcoming:
+            return None
+        return self.queue[upcoming[0]]
 
     @property
     def voice_client(self) -> VoiceClient:
@@ -231,40 +414,128 @@ class MusicSession:
     @style.setter
     def style(self, value: PlayStyle):
         self._play_style = value
+        if value is PlayStyle.SHUFFLE:
+            self._shuffle.reset(len(self.queue), self.at)
 
     @property
     def voice(self):
         return self.guild.me.voice
 
     @property
-    def remaining_tracks(self):
-        return [track for i, track in enumerate(self.queue) if i >= self.at]
+    def remaining_tracks(self) -> QueueView:
+        return self.queue.view(self.at)
 
-    def start_queue(self):
+    def start_queue(self, source: Optional[PositionTracker] = None):
         """
         Marks the start of the queue
         """
-        self._started_song_at = datetime.utcnow()
+        self.mark_started(source)
+
+    def mark_started(self, source: Optional[PositionTracker]):
+        """
+        Marks the current track as playing from `source`, the playing position
+        is taken from the frames it hands to the voice client.
+        """
+        self.playback = source
+
+    def seek(self, position: int):
+        """
+        Restarts the current track at `position` seconds once the voice client
+        stops, the playing position follows as soon as it starts again.
+        """
+        self.start_track_at = position
+        self.is_controller_moved = True
 
     def clear_queue(self):
-        self.queue = [self.queue[self.at]]
+        self.queue = TrackQueue(Track.from_row, [self.queue[self.at]])
         self.at = 0
+        self._shuffle.reset(len(self.queue))
 
     def is_queue_remaining(self):
-        return len(self.remaining_tracks) > 1 or self._play_style in (PlayStyle.LOOP_QUEUE, PlayStyle.LOOP_TRACK)
+        if self._play_style is PlayStyle.SHUFFLE:
+            return len(self.queue) > 1
+        return len(self.queue) - self.at > 1 or self._play_style in (PlayStyle.LOOP_QUEUE, PlayStyle.LOOP_TRACK)
 
     def total_time(self) -> int:
-        return sum(t.duration for t in self.remaining_tracks)
+        return self.queue.duration_from(self.at)
 
     def place(self, track) -> int:
         return self.queue.index(track)
 
     def add(self, *tracks: Track):
+        shuffling = self._play_style is PlayStyle.SHUFFLE
         if self.is_auto_queue:
             for t in tracks:
                 self.queue.insert(self.at + 1, t)
+                if shuffling:
+                    self._shuffle.insert(self.at + 1)
+        else:
+            for t in tracks:
+                self.queue.append(t)
+                if shuffling:
+                    self._shuffle.insert(len(self.queue) - 1)
+        for track in tracks:
+            # tracks the bot picked itself only count once finished or skipped
+            if not track.auto_queued:
+                self.observe(track)
+
+    def observe(self, track: Track, weight: float = 1.0):
+        """
+        Counts a track towards the taste profile, or holds on to it until its
+        audio features are loaded.
+        """
+        if track.type is not TrackType.SPOTIFY:
+            return
+        features = track.audio_features or AUDIO_FEATURES.get(track.id)
+        if features is None:
+            self._unprofiled.append((track, weight))
         else:
-            self.queue.extend(tracks)
+            self.taste.update(track.id, features, weight)
+
+    def finish_current(self):
+        self.observe(self.now_playing, TASTE_FINISH_WEIGHT)
+
+    def skip_current(self):
+        self.queue.mark_skipped(self.at)
+        self.observe(self.now_playing, TASTE_SKIP_WEIGHT)
+
+    @property
+    def unprofiled_tracks(self) -> List[Track]:
+        return [track for track, _ in self._unprofiled]
+
+    def profile_loaded(self, loaded: List[Track]):
+        """
+        Counts the pending tracks whose audio features have just been loaded,
+        the ones spotify has no features for are dropped.
+        """
+        attempted = {track.id for track in loaded}
+        for _ in range(len(self._unprofiled)):
+            track, weight = self._unprofiled.popleft()
+            features = track.audio_features or AUDIO_FEATURES.get(track.id)
+            if features is not None:
+                self.taste.update(track.id, features, weight)
+            elif track.id not in attempted:
+                self._unprofiled.append((track, weight))
+
+    def upcoming_indices(self, count: int) -> List[int]:
+        """
+        Returns the queue indices of the next `count` tracks in the order they
+        are going to be played with the current play style.
+        """
+        if self._play_style is PlayStyle.NORMAL:
+            return list(range(self.at + 1, min(self.at + 1 + count, len(self.queue))))
+        elif self._play_style is PlayStyle.LOOP_TRACK:
+            return [self.at]
+        elif self._play_style is PlayStyle.LOOP_QUEUE:
+            return [
+                (self.at + i) % len(self.queue)
+                for i in range(1, min(count, len(self.queue)) + 1)
+            ]
+        elif self._play_style is PlayStyle.SHUFFLE:
+            # shuffle picks are drawn ahead of time so they can be prefetched
+            return self._shuffle.upcoming(count)
+        else:
+            raise Exception("Unrecognized play style")
 
     def get_next_song_index(self, offset: int = 1):
         """
@@ -277,7 +548,7 @@ class MusicSession:
         elif self._play_style is PlayStyle.LOOP_QUEUE:
             next_at = (self.at + offset) % len(self.queue)
         elif self._play_style is PlayStyle.SHUFFLE:
-            next_at = random.randint(0, len(self.queue) - 2)
+            next_at = self._shuffle.peek(offset)
         else:
             raise Exception("Unrecognized play style")
         return next_at
@@ -286,23 +557,88 @@ class MusicSession:
         """
         Set the next track to play.
         """
-        self._started_song_at = datetime.utcnow()
         idx = self.get_next_song_index(offset)
         if idx >= len(self.queue) or idx < 0:
             raise IndexError("No more tracks in queue")
         else:
             self.at = idx
+            self.playback = None  # the next track hasn't started yet
+            if self._play_style is PlayStyle.SHUFFLE:
+                self._shuffle.move(offset)
         print(f"[{self.guild.name}] Moved to track", self.at)
 
+    def prefetch(self, spotify_api):
+        """
+        Warms the sources and audio features of the lookahead window.
+
+        Prefetches of tracks that are no longer inside the window, because the
+        queue, the position or the play style changed, are cancelled.
+        """
+        window: Dict[str, Track] = {}
+        for i in self.upcoming_indices(self.lookahead):
+            track = self.queue[i]
+            window.setdefault(track.id, track)
+
+        for track_id in list(self._prefetches):
+            if track_id not in window:
+                self._prefetches.pop(track_id).cancel()
+
+        loop = asyncio.get_running_loop()
+        for track_id, track in window.items():
+            if track_id in self._prefetches:
+                continue
+            task = loop.create_task(track.load_all(spotify_api))
+            task.add_done_callback(self._on_prefetched)
+            self._prefetches[track_id] = task
+
+    async def wait_prefetch(self, track: Track):
+        """
+        Waits for a running prefetch of the track so it isn't resolved twice.
+        """
+        task = self._prefetches.get(track.id)
+        if task is not None:
+            await asyncio.wait((task,))
+
+    def cancel_prefetch(self):
+        for task in self._prefetches.values():
+            task.cancel()
+        self._prefetches.clear()
+
+    def _on_prefetched(self, task: asyncio.Task):
+        for track_id, running in list(self._prefetches.items()):
+            if running is task:
+                self._prefetches.pop(track_id)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[{self.guild.name}] Prefetch failed: {task.exception()!r}")
+
+    @property
+    def loading_progress(self) -> Optional[Tuple[int, int]]:
+        """
+        Returns how many tracks of the playlists still being appended in the
+        background have been loaded, out of how many.
+        """
+        if not self._loading:
+            return None
+        loaded, total = zip(*self._loading.values())
+        return sum(loaded), sum(total)
+
+    def set_loading(self, loader: asyncio.Task, loaded: int, total: int):
+        self._loading[loader] = (loaded, total)
+
+    def done_loading(self, loader: asyncio.Task):
+        self._loading.pop(loader, None)
+
     def pause(self):
         self.voice_client.pause()
-        self._last_paused = datetime.utcnow()
 
     def resume(self):
         self.voice_client.resume()
-        self._last_paused = None
 
     async def disconnect(self):
+        self.renderer.cancel()
+        self.cancel_prefetch()
+        for loader in list(self._loading):
+            loader.cancel()
         await self.voice_client.disconnect()
         msg = None
         if self.controller:
@@ -322,20 +658,33 @@ class MusicSession:
         if self._voice_client is None:
             # joining a new voice channel
             print(f"[{self.guild.name}] Joining channel {self.voice_channel.name}")
-            self._voice_client = await self.voice_channel.connect(timeout=6000)
-        elif self._voice_client.channel != self.commander.voice.channel:
+            with PLAY_LATENCY.time("ensure_voice_connection", self.guild.id):
+                self._voice_client = await self.voice_channel.connect(timeout=6000)
+        elif self._voice_client.channel != self.voice_channel:
             print(f"[{self.guild.name}] Moved to channel {self.voice_channel.name}")
-            await self._voice_client.move_to(self.voice_channel)
+            with PLAY_LATENCY.time("ensure_voice_connection", self.guild.id):
+                await self._voice_client.move_to(self.voice_channel)
 
     async def update_controller(self):
+        """
+        Schedules a refresh of the controller, refreshes requested in a burst
+        are coalesced into a single edit.
+        """
         if not self.controller:
             return
-        if isinstance(self.controller, WebhookMessage):
-            await self.controller.edit(content="", embed=self.get_queue_embed())  # type: ignore
+        self.renderer.request()
+
+    async def edit_controller(self, embed: Embed):
+        if isinstance(self.controller, Interaction):
+            await self.controller.edit_original_response(content="", embed=embed)
         else:
-            await self.controller.edit_original_response(
-                content="", embed=self.get_queue_embed()
-            )
+            await self.controller.edit(content="", embed=embed)  # type: ignore
+
+    @property
+    def controller_channel_id(self) -> int:
+        if isinstance(self.controller, Interaction):
+            return self.controller.channel_id  # type: ignore
+        return self.controller.channel.id  # type: ignore
 
     def get_queue_embed(self) -> Embed:
         embed = Embed(color=0x0074BA)
@@ -375,10 +724,11 @@ class MusicSession:
             name="Songs in queue",
             value=f"{len(self.queue)} {'song' if len(self.queue) == 1 else 'songs'}",
         )
+        upcoming = self.upcoming_indices(1)
         embed.add_field(
             name="Next-Up",
-            value=f"{self.at+2}. {self.upcoming_track.title}"
-            if self.upcoming_track
+            value=f"{upcoming[0]+1}. {self.queue[upcoming[0]].title}"
+            if upcoming
             else f"`{'🚫':^9}`",
         )
 
@@ -389,7 +739,7 @@ class MusicSession:
         end = min(self.at + 3, len(self.queue))
 
         for i in range(start, end):
-            track = self.queue[i]
+            track = self.now_playing if i == self.at else self.queue[i]
             row = f"{i+1}. [{track.title}]({track.url}) ||{':'.join(self.format_duration(track.duration))}|| *({track.requested_by})*\n"
             if i == self.at:
                 queue += f"**{row}**"
@@ -403,8 +753,14 @@ class MusicSession:
             value=f"{queue}{f'... and {remainder} more.' if remainder >= 1 else ''}",
             inline=False,
         )
+        footer = []
         if self.is_auto_queue:
-            embed.set_footer(text=f"🔁 Auto queue is enabled.")
+            footer.append("🔁 Auto queue is enabled.")
+        progress = self.loading_progress
+        if progress is not None:
+            footer.append(f"📥 Loading tracks {progress[0]}/{progress[1]}")
+        if footer:
+            embed.set_footer(text=" ".join(footer))
         return embed
 
     def format_duration(self, seconds):
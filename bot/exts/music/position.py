@@ -0,0 +1,58 @@
+import time
+
+from discord import AudioSource
+
+from bot.utils.metrics import SHARD_METRICS
+
+# seconds of audio in every frame the voice client reads, pcm or opus
+FRAME_LENGTH = 0.02
+
+
+class PositionTracker(AudioSource):
+    """
+    Wraps an audio source and keeps the playing position by counting the
+    frames actually handed to the voice client. The voice client stops
+    reading while paused, so pauses need no bookkeeping, and a stalled ffmpeg
+    holds the position back instead of letting it drift ahead.
+
+    A read that blocks for longer than a frame lasts is counted as an
+    underrun, the listeners hear a gap of about `stalled` seconds overall.
+    """
+
+    def __init__(self, source: AudioSource, offset: int = 0, shard_id: int = 0) -> None:
+        self.source = source
+        self.offset = offset  # seconds into the track the source starts at
+        self.shard_id = shard_id
+        self.frames = 0
+        self.underruns = 0
+        self.stalled = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Seconds of audio played from this source.
+        """
+        return self.frames * FRAME_LENGTH
+
+    @property
+    def position(self) -> float:
+        return self.offset + self.elapsed
+
+    def read(self) -> bytes:
+        started = time.monotonic()
+        data = self.source.read()
+        took = time.monotonic() - started
+        if data:
+            # the first read waits on ffmpeg to start, that isn't a gap
+            if took > FRAME_LENGTH and self.frames:
+                self.underruns += 1
+                self.stalled += took - FRAME_LENGTH
+                SHARD_METRICS.inc("underruns", self.shard_id)
+            self.frames += 1
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
@@ -0,0 +1,306 @@
+import sys
+
+from array import array
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Sequence,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    overload,
+)
+
+if TYPE_CHECKING:
+    from bot.exts.music.player import Track
+
+# (id, title, artists, url, thumbnail, duration, type code, commander id, flags)
+TrackRow = Tuple[str, str, Tuple[str, ...], Optional[str], str, int, int, int, int]
+
+AUTO_QUEUED = 0b01
+SKIPPED = 0b10
+
+
+class TrackQueue:
+    """
+    The tracks of a session stored column by column instead of as a list of
+    `Track` objects. Strings are interned, durations and commander ids live in
+    arrays, and a `Track` is only materialized when an entry is looked up.
+
+    A fenwick tree over the duration column and an index of where every track
+    id first appears are kept alongside. Appending keeps both up to date in
+    O(log n). Inserting or removing at a position only invalidates the tree
+    nodes from that position on, the nodes before it still hold, so the
+    duration left from the current track stays O(log n) while auto-queue
+    inserts right after it. The rest of the tree is rebuilt from where it
+    went stale once a sum reaches past it, in O(n - position). The id index
+    is only used for lookups by track and is rebuilt in O(n) on the next one.
+    """
+
+    def __init__(
+        self, factory: Callable[[TrackRow], "Track"], tracks: Iterable["Track"] = ()
+    ) -> None:
+        self.factory = factory
+
+        self._ids: List[str] = []
+        self._titles: List[str] = []
+        self._artists: List[Tuple[str, ...]] = []
+        self._urls: List[Optional[str]] = []
+        self._thumbnails: List[str] = []
+        self._durations = array("L")
+        self._types = bytearray()
+        self._commanders = array("Q")
+        self._flags = bytearray()
+        self._artist_pool: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+        self._tree: List[int] = [0]  # 1-based, _tree[i] covers (i - lowbit(i), i]
+        self._valid = 0  # the tree holds the nodes up to here, all up to date
+        self._total = 0  # sum of every duration
+        self._positions: Dict[str, int] = {}
+        self._dirty = True  # whether _positions has to be rebuilt
+        # bumped by every change other than an append, so anything mirroring
+        # the queue knows whether appending the new rows is enough
+        self.version = 0
+
+        for track in tracks:
+            self._store(len(self._ids), track.to_row())
+        self._total = sum(self._durations)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator["Track"]:
+        for i in range(len(self._ids)):
+            yield self.factory(self.row(i))
+
+    @overload
+    def __getitem__(self, index: int) -> "Track":
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List["Track"]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self.factory(self.row(i)) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self._ids)
+        if not 0 <= index < len(self._ids):
+            raise IndexError("queue index out of range")
+        return self.factory(self.row(index))
+
+    def __contains__(self, track_id: str) -> bool:
+        self._ensure_index()
+        return track_id in self._positions
+
+    def row(self, index: int) -> TrackRow:
+        return (
+            self._ids[index],
+            self._titles[index],
+            self._artists[index],
+            self._urls[index],
+            self._thumbnails[index],
+            self._durations[index],
+            self._types[index],
+            self._commanders[index],
+            self._flags[index],
+        )
+
+    def id_at(self, index: int) -> str:
+        return self._ids[index]
+
+    def track_ids(self) -> List[str]:
+        return list(self._ids)
+
+    def duration_at(self, index: int) -> int:
+        return self._durations[index]
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> "QueueView":
+        return QueueView(self, start, len(self._ids) if stop is None else stop)
+
+    def _store(self, index: int, row: TrackRow):
+        track_id, title, artists, url, thumbnail, duration, type_code, commander_id, flags = row
+        artists = tuple(sys.intern(artist) for artist in artists)
+        artists = self._artist_pool.setdefault(artists, artists)
+
+        self._ids.insert(index, sys.intern(track_id))
+        self._titles.insert(index, sys.intern(title))
+        self._artists.insert(index, artists)
+        self._urls.insert(index, url)
+        self._thumbnails.insert(index, sys.intern(thumbnail))
+        self._durations.insert(index, duration)
+        self._types.insert(index, type_code)
+        self._commanders.insert(index, commander_id)
+        self._flags.insert(index, flags)
+
+    def _remove(self, index: int) -> TrackRow:
+        row = self.row(index)
+        for column in (
+            self._ids,
+            self._titles,
+            self._artists,
+            self._urls,
+            self._thumbnails,
+            self._durations,
+            self._types,
+            self._commanders,
+            self._flags,
+        ):
+            del column[index]
+        return row
+
+    def _rebuild(self):
+        positions: Dict[str, int] = {}
+        for i, track_id in enumerate(self._ids):
+            positions.setdefault(track_id, i)
+
+        self._positions = positions
+        self._dirty = False
+
+    def _ensure_index(self):
+        if self._dirty:
+            self._rebuild()
+
+    def _rebuild_tree(self):
+        """
+        Recomputes the tree nodes after the last valid one. A node's sum is
+        the difference of two prefix sums, the ones before the valid point
+        come from the tree and the rest from a running sum.
+        """
+        size = len(self._ids)
+        start = self._valid
+        running = [self._prefix(start)]  # prefix sums from `start` on
+        for i in range(start + 1, size + 1):
+            running.append(running[-1] + self._durations[i - 1])
+            low = i - (i & -i)
+            before = running[low - start] if low >= start else self._prefix(low)
+            self._tree.append(running[-1] - before)
+        self._valid = size
+
+    def _prefix(self, count: int) -> int:
+        """
+        Sum of the durations of the first `count` tracks.
+        """
+        if count > self._valid:
+            self._rebuild_tree()
+        total = 0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    def _invalidate(self, index: int):
+        if index < self._valid:
+            self._valid = index
+            del self._tree[index + 1 :]
+        self._dirty = True
+        self.version += 1
+
+    def append(self, track: "Track"):
+        size = len(self._ids) + 1
+        self._store(size - 1, track.to_row())
+        self._total += track.duration
+        if self._valid == size - 1:
+            # the new node covers itself and the nodes that became its children
+            self._tree.append(
+                track.duration + self._prefix(size - 1) - self._prefix(size - (size & -size))
+            )
+            self._valid = size
+        if not self._dirty:
+            self._positions.setdefault(track.id, size - 1)
+
+    def extend(self, tracks: Iterable["Track"]):
+        for track in tracks:
+            self.append(track)
+
+    def insert(self, index: int, track: "Track"):
+        if index >= len(self._ids):
+            self.append(track)
+        else:
+            self._store(index, track.to_row())
+            self._total += track.duration
+            self._invalidate(index)
+
+    def pop(self, index: int = -1) -> "Track":
+        if index < 0:
+            index += len(self._ids)
+        row = self._remove(index)
+        self._total -= row[5]
+        if index != len(self._ids):
+            self._invalidate(index)
+            return self.factory(row)
+
+        self.version += 1
+        if self._valid > index:  # the popped track's node was the last one
+            self._tree.pop()
+            self._valid = index
+        if not self._dirty and self._positions.get(row[0]) == index:
+            del self._positions[row[0]]
+        return self.factory(row)
+
+    def mark_skipped(self, index: int, skipped: bool = True):
+        self.version += 1
+        if skipped:
+            self._flags[index] |= SKIPPED
+        else:
+            self._flags[index] &= ~SKIPPED
+
+    def index(self, track: "Track") -> int:
+        """
+        Position of the first occurrence of the track in O(1).
+        """
+        self._ensure_index()
+        try:
+            return self._positions[track.id]
+        except KeyError:
+            raise ValueError(f"{track.title} is not in queue") from None
+
+    def duration_from(self, start: int) -> int:
+        """
+        Total duration of the tracks from `start` to the end of the queue.
+        """
+        return self._total - self._prefix(start)
+
+
+class QueueView(Sequence["Track"]):
+    """
+    A window of a `TrackQueue` that is taken without copying anything, the
+    ids and durations are read straight from the columns and a `Track` is
+    only materialized for the entries that are looked up.
+    """
+
+    def __init__(self, queue: TrackQueue, start: int, stop: int) -> None:
+        self.queue = queue
+        self.start = start
+        self.stop = max(start, stop)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    @overload
+    def __getitem__(self, index: int) -> "Track":
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List["Track"]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self.queue[self.start + i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("queue view index out of range")
+        return self.queue[self.start + index]
+
+    def ids(self) -> List[str]:
+        return self.queue._ids[self.start : self.stop]
+
+    def duration(self) -> int:
+        return self.queue.duration_from(self.start) - self.queue.duration_from(self.stop)
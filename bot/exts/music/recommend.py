@@ -0,0 +1,169 @@
+import heapq
+
+from array import array
+from collections import deque
+from typing import TYPE_CHECKING, Collection, Deque, Dict, List, Optional, Sequence
+
+from bot.constants import RECOMMENDER_POOL_SIZE, TASTE_DECAY
+from bot.exts.music.queue import TrackRow
+
+try:
+    import numpy as np
+except ImportError:  # the nearest tracks are then found in plain python
+    np = None
+
+if TYPE_CHECKING:
+    from bot.exts.music.player import Track
+
+# all supported features for recommendations are set here
+FEATURE_NAMES = ("danceability", "energy", "valence", "instrumentalness")
+
+
+class FeaturePool:
+    """
+    The audio features of every spotify track the bot has seen, stored as one
+    float32 matrix with a row per track so the tracks nearest to a target can
+    be found with a couple of vectorized operations.
+
+    The matrix lives in a flat array that numpy views without copying. Once
+    `capacity` tracks are pooled the oldest rows are overwritten.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.width = len(FEATURE_NAMES)
+
+        self._values = array("f")  # row major, `width` features per track
+        self._rows: List[TrackRow] = []
+        self._index: Dict[str, int] = {}  # track id -> row
+        self._added = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._index
+
+    def add(self, track: "Track", features: dict):
+        if track.id in self._index:
+            return
+
+        # who requested it and whether it got skipped don't carry over
+        row = track.to_row()[:-2] + (0, 0)
+        vector = [float(features[name]) for name in FEATURE_NAMES]
+        slot = self._added % self.capacity
+        self._added += 1
+
+        if slot == len(self._rows):
+            self._rows.append(row)  # type: ignore
+            self._values.extend(vector)
+        else:
+            del self._index[self._rows[slot][0]]
+            self._rows[slot] = row  # type: ignore
+            self._values[slot * self.width : (slot + 1) * self.width] = array("f", vector)
+        self._index[track.id] = slot
+
+    def nearest(
+        self, target: Sequence[float], k: int, exclude: Collection[str], min_pool: int = 0
+    ) -> Optional[List[TrackRow]]:
+        """
+        The k pooled tracks closest to the target features, nearest first.
+        Returns None when fewer than min_pool tracks are left to pick from
+        once the excluded ids are taken out.
+        """
+        excluded = [self._index[track_id] for track_id in exclude if track_id in self._index]
+        if len(self._rows) - len(excluded) < max(min_pool, k, 1):
+            return None
+
+        if np is None:
+            distances = [
+                sum(
+                    (self._values[i * self.width + j] - target[j]) ** 2
+                    for j in range(self.width)
+                )
+                for i in range(len(self._rows))
+            ]
+            for i in excluded:
+                distances[i] = float("inf")
+            nearest = heapq.nsmallest(k, range(len(distances)), key=distances.__getitem__)
+            return [self._rows[i] for i in nearest]
+
+        matrix = np.frombuffer(self._values, dtype=np.float32).reshape(-1, self.width)
+        distances = np.square(matrix - np.asarray(target, dtype=np.float32)).sum(axis=1)
+        del matrix  # the array can't grow while numpy still views it
+        distances[excluded] = np.inf
+
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [self._rows[i] for i in nearest.tolist()]
+
+
+class TasteProfile:
+    """
+    Running averages of the audio features of the tracks a session liked and
+    of the ones it skipped, updated in constant time as tracks come and go.
+
+    Every update first scales the sums by `decay` so that older tracks count
+    less, a decay of 1 keeps plain averages. Tracks are counted as skipped
+    when updated with a negative weight. The skipped average only pushes the
+    liked one away from it by at most `repulsion`, so a profile that is mostly
+    skips can't run off to the extremes. The most recent liked tracks are kept
+    as seeds.
+    """
+
+    def __init__(
+        self, decay: float = TASTE_DECAY, seed_count: int = 5, repulsion: float = 0.25
+    ) -> None:
+        self.decay = decay
+        self.repulsion = repulsion
+        self.liked = [0.0] * len(FEATURE_NAMES)
+        self.liked_weight = 0.0
+        self.skipped = [0.0] * len(FEATURE_NAMES)
+        self.skipped_weight = 0.0
+        self.seeds: Deque[str] = deque(maxlen=seed_count)  # most recent first
+
+    def update(self, track_id: str, features: dict, weight: float):
+        liked, skipped = max(weight, 0.0), max(-weight, 0.0)
+        for i, name in enumerate(FEATURE_NAMES):
+            self.liked[i] = self.liked[i] * self.decay + liked * features[name]
+            self.skipped[i] = self.skipped[i] * self.decay + skipped * features[name]
+        self.liked_weight = self.liked_weight * self.decay + liked
+        self.skipped_weight = self.skipped_weight * self.decay + skipped
+
+        if track_id in self.seeds:
+            self.seeds.remove(track_id)
+        if weight > 0:
+            self.seeds.appendleft(track_id)
+
+    def merge(self, other: "TasteProfile"):
+        for i in range(len(FEATURE_NAMES)):
+            self.liked[i] += other.liked[i]
+            self.skipped[i] += other.skipped[i]
+        self.liked_weight += other.liked_weight
+        self.skipped_weight += other.skipped_weight
+        for track_id in reversed(other.seeds):
+            if track_id in self.seeds:
+                self.seeds.remove(track_id)
+            self.seeds.appendleft(track_id)
+
+    def vector(self) -> Optional[List[float]]:
+        """
+        The average liked features pushed away from the skipped ones, or None
+        while nothing liked has been heard.
+        """
+        if self.liked_weight <= 1e-6 or not self.seeds:
+            return None
+
+        liked = [value / self.liked_weight for value in self.liked]
+        if self.skipped_weight <= 1e-6:
+            return liked
+        # how much of the profile is skips, in [0, 1)
+        share = self.skipped_weight / (self.liked_weight + self.skipped_weight)
+        push = self.repulsion * share
+        return [
+            min(max(value + push * (value - skipped / self.skipped_weight), 0.0), 1.0)
+            for value, skipped in zip(liked, self.skipped)
+        ]
+
+
+FEATURE_POOL = FeaturePool(RECOMMENDER_POOL_SIZE)
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from discord import Embed
+from discord.errors import HTTPException
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from bot.constants import CONTROLLER_DEBOUNCE, CONTROLLER_EDIT_PERIOD, CONTROLLER_EDITS
+
+if TYPE_CHECKING:
+    from bot.exts.music.player import MusicSession
+
+
+class EditBudget:
+    """
+    A token bucket of message edits for every channel, so that controller
+    refreshes stay inside discord's per-channel rate limit instead of
+    collecting 429s.
+    """
+
+    def __init__(self, rate: int, per: float) -> None:
+        self.rate = rate
+        self.per = per
+        self._buckets: Dict[int, Tuple[float, float]] = {}  # channel id -> (tokens, updated at)
+
+    def take(self, channel_id: int) -> float:
+        """
+        Takes an edit out of the channel's budget and returns how many seconds
+        to wait before it may be sent.
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(channel_id, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - updated_at) * self.rate / self.per) - 1
+        self._buckets[channel_id] = (tokens, now)
+        return 0 if tokens >= 0 else -tokens * self.per / self.rate
+
+    async def acquire(self, channel_id: int):
+        delay = self.take(channel_id)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+EDIT_BUDGET = EditBudget(CONTROLLER_EDITS, CONTROLLER_EDIT_PERIOD)
+
+
+class ControllerRenderer:
+    """
+    Coalesces the controller refreshes of a session, a burst of requests is
+    debounced into one edit and an edit identical to the last one is dropped.
+    """
+
+    def __init__(self, session: "MusicSession", debounce: float = CONTROLLER_DEBOUNCE) -> None:
+        self.session = session
+        self.debounce = debounce
+
+        self._pending = False
+        self._task: Optional[asyncio.Task] = None
+        self._last: Optional[dict] = None
+
+    def request(self):
+        self._pending = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._render())
+
+    def remember(self, embed: Embed):
+        """
+        Records an embed that was sent outside of the renderer.
+        """
+        self._last = embed.to_dict()
+
+    def cancel(self):
+        self._pending = False
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _render(self):
+        while self._pending:
+            await asyncio.sleep(self.debounce)
+            if self.session.get_queue_embed().to_dict() == self._last:
+                # nothing changed, don't spend any of the budget on it
+                self._pending = False
+                continue
+
+            await EDIT_BUDGET.acquire(self.session.controller_channel_id)
+            # anything requested until now is covered by this edit
+            self._pending = False
+            embed = self.session.get_queue_embed()
+            payload = embed.to_dict()
+
+            try:
+                await self.session.edit_controller(embed)
+            except HTTPException as e:
+                print(f"[{self.session.guild.name}] Controller edit failed: {e}")
+            else:
+                self._last = payload
@@ -0,0 +1,101 @@
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Iterator, Optional
+
+from bot.exts.music.idle import IdleScheduler
+from bot.utils.metrics import SHARD_METRICS
+
+if TYPE_CHECKING:
+    from bot.exts.music.player import MusicSession
+
+
+class ShardSessions:
+    """
+    The sessions of the guilds on a single shard along with their idle timers.
+    """
+
+    def __init__(self, shard_id: int, on_idle: Callable[[int], Awaitable[None]]) -> None:
+        self.shard_id = shard_id
+        self.sessions: Dict[int, "MusicSession"] = {}  # guild id -> session
+        self.idle = IdleScheduler(on_idle)
+        self.connected = True  # whether the shard's gateway connection is up
+
+    def close(self):
+        self.idle.close()
+
+
+class SessionRegistry:
+    """
+    The music sessions of every guild, grouped by the shard the guild is on so
+    that a shard's gateway reconnect only concerns its own sessions and idle
+    timers.
+
+    Sessions are looked up by guild id through `get`, `pop` and `in`, like the
+    dict they used to be stored in, but iterating goes over the sessions and
+    a session is put in with `add`, which places its guild on its shard.
+    """
+
+    def __init__(self, on_idle: Callable[[int], Awaitable[None]]) -> None:
+        self.on_idle = on_idle
+        self._shards: Dict[int, ShardSessions] = {}
+        self._guild_shards: Dict[int, int] = {}  # guild id -> shard id
+
+    def __len__(self) -> int:
+        return len(self._guild_shards)
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._guild_shards
+
+    def __iter__(self) -> Iterator["MusicSession"]:
+        for shard in list(self._shards.values()):
+            yield from list(shard.sessions.values())
+
+    def shard(self, shard_id: int) -> ShardSessions:
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            shard = self._shards[shard_id] = ShardSessions(shard_id, self.on_idle)
+        return shard
+
+    def shard_of(self, guild_id: int) -> Optional[ShardSessions]:
+        shard_id = self._guild_shards.get(guild_id)
+        if shard_id is None:
+            return None
+        return self._shards[shard_id]
+
+    def get(self, guild_id: int) -> Optional["MusicSession"]:
+        shard = self.shard_of(guild_id)
+        if shard is None:
+            return None
+        return shard.sessions.get(guild_id)
+
+    def add(self, session: "MusicSession"):
+        guild_id = session.guild.id
+        shard = self.shard(session.guild.shard_id)
+        shard.sessions[guild_id] = session
+        self._guild_shards[guild_id] = shard.shard_id
+        SHARD_METRICS.set("sessions", shard.shard_id, len(shard.sessions))
+
+    def pop(self, guild_id: int) -> Optional["MusicSession"]:
+        shard = self.shard_of(guild_id)
+        if shard is None:
+            return None
+        del self._guild_shards[guild_id]
+        shard.idle.cancel(guild_id)
+        session = shard.sessions.pop(guild_id, None)
+        SHARD_METRICS.set("sessions", shard.shard_id, len(shard.sessions))
+        return session
+
+    def arm_idle(self, guild_id: int, delay: float):
+        shard = self.shard_of(guild_id)
+        if shard is not None:
+            shard.idle.arm(guild_id, delay)
+
+    def cancel_idle(self, guild_id: int) -> bool:
+        shard = self.shard_of(guild_id)
+        return shard is not None and shard.idle.cancel(guild_id)
+
+    def is_idle(self, guild_id: int) -> bool:
+        shard = self.shard_of(guild_id)
+        return shard is not None and guild_id in shard.idle
+
+    def close(self):
+        for shard in self._shards.values():
+            shard.close()
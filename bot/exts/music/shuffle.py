@@ -0,0 +1,115 @@
+import random
+
+from typing import List
+
+
+class ShuffleOrder:
+    """
+    The order a shuffled queue is played in, drawn a track at a time with an
+    incremental Fisher-Yates shuffle. Tracks are drawn only as far ahead as
+    they are asked for, so the next track is known before it plays and no
+    track repeats until every other one has been played.
+
+    `order[:drawn]` holds the tracks drawn so far with the one playing at
+    `cursor`, the ones after it are yet to be drawn. Once every track has
+    been played a new round starts from the one playing.
+
+    Tracks inserted into the middle of the queue shift the indices after
+    them, so the order holds indices as of the last renumbering and the
+    insert positions since then are replayed on the few indices read. New
+    tracks are stored as a reference to their insert, `-1` for the first.
+    The order is renumbered once about sqrt(n) inserts have piled up.
+    """
+
+    def __init__(self, size: int = 0, start: int = 0) -> None:
+        self.reset(size, start)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def reset(self, size: int, start: int = 0):
+        self.order = list(range(size))
+        if size:
+            self.order[0], self.order[start] = start, 0
+        self.cursor = 0
+        self.drawn = min(size, 1)
+        self._base = size  # indices stored as of the last renumbering
+        self._inserts: List[int] = []  # positions inserted at since then
+
+    @property
+    def current(self) -> int:
+        return self._resolve(self.order[self.cursor])
+
+    def _resolve(self, stored: int) -> int:
+        """
+        The queue index of a stored entry as of now.
+        """
+        if stored >= 0:
+            index, first = stored, 0
+        else:
+            index, first = self._inserts[-stored - 1], -stored
+        for i in range(first, len(self._inserts)):
+            if index >= self._inserts[i]:
+                index += 1
+        return index
+
+    def _renumber(self):
+        entries = list(range(self._base))
+        for i, position in enumerate(self._inserts):
+            entries.insert(position, -i - 1)
+        index = {stored: i for i, stored in enumerate(entries)}
+        self.order = [index[stored] for stored in self.order]
+        self._base = len(self.order)
+        self._inserts = []
+
+    def _draw(self):
+        pick = random.randrange(self.drawn, len(self.order))
+        self.order[self.drawn], self.order[pick] = self.order[pick], self.order[self.drawn]
+        self.drawn += 1
+
+    def upcoming(self, count: int) -> List[int]:
+        """
+        The indices of the next `count` tracks, drawing the ones that haven't
+        been drawn yet. Never reaches past the end of the round.
+        """
+        if self.cursor + 1 == len(self.order) > 1:
+            self.reset(len(self.order), self.current)
+        end = min(self.cursor + 1 + count, len(self.order))
+        while self.drawn < end:
+            self._draw()
+        return [self._resolve(stored) for stored in self.order[self.cursor + 1 : end]]
+
+    def peek(self, offset: int) -> int:
+        """
+        The index `offset` tracks away from the one playing, a negative offset
+        goes back through the tracks played this round.
+        """
+        if offset > 0:
+            upcoming = self.upcoming(offset)
+            if len(upcoming) < offset:
+                raise IndexError("No more tracks in shuffle")
+            return upcoming[-1]
+        if self.cursor + offset < 0:
+            raise IndexError("No more tracks in shuffle")
+        return self._resolve(self.order[self.cursor + offset])
+
+    def move(self, offset: int) -> int:
+        self.peek(offset)  # draws the tracks up to the new position
+        self.cursor += offset
+        return self.current
+
+    def insert(self, index: int):
+        """
+        Follows a track being inserted into the queue at `index`, it joins the
+        tracks that are yet to be drawn.
+        """
+        if index >= len(self.order):
+            # the indices after the last renumbering resolve to the end
+            self.order.append(self._base)
+            self._base += 1
+            return
+
+        self._inserts.append(index)
+        self.order.append(-len(self._inserts))
+        if len(self._inserts) ** 2 > len(self.order):
+            self._renumber()
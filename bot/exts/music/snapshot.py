@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import time
+
+from dataclasses import dataclass
+from os import makedirs, path
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from bot.exts.music.cache import SOURCE_CACHE
+from bot.exts.music.queue import TrackQueue, TrackRow
+
+if TYPE_CHECKING:
+    from bot.exts.music.player import MusicSession
+
+
+@dataclass
+class SessionState:
+    guild_id: int
+    voice_channel_id: int
+    cmd_channel_id: int
+    commander_id: int
+    at: int
+    position: int
+    style: str
+    volume: float
+    auto_queue: bool
+    paused: bool
+    sources: Dict[str, str]  # track id -> stream url, for the tracks up next
+    saved_at: float
+
+
+class SessionSnapshots:
+    """
+    Saves the state of every music session to sqlite so the sessions can be
+    resumed after a restart.
+
+    Snapshots are incremental, tracks appended since the last snapshot are
+    added on their own and the queue is only rewritten when anything else
+    about it changed. Writes happen inside executor threads.
+    """
+
+    def __init__(self, location: str) -> None:
+        directory = path.dirname(location)
+        if directory:
+            makedirs(directory, exist_ok=True)
+
+        self._lock = Lock()
+        # guild id -> (queue, queue version, rows stored) as of the last snapshot
+        self._saved: Dict[int, Tuple[TrackQueue, int, int]] = {}
+        self._db = sqlite3.connect(location, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "guild_id INTEGER PRIMARY KEY, state TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            "guild_id INTEGER NOT NULL, position INTEGER NOT NULL, id TEXT NOT NULL, "
+            "title TEXT NOT NULL, artists TEXT NOT NULL, url TEXT, thumbnail TEXT NOT NULL, "
+            "duration INTEGER NOT NULL, type INTEGER NOT NULL, commander_id INTEGER NOT NULL, "
+            "flags INTEGER NOT NULL, PRIMARY KEY (guild_id, position));"
+        )
+        self._db.commit()
+
+    def capture(
+        self, session: "MusicSession"
+    ) -> Tuple[SessionState, int, List[TrackRow]]:
+        """
+        Takes the state of a session along with the queue rows that have to be
+        written, starting from the returned position. Runs on the event loop
+        so the session can't change halfway through.
+        """
+        queue = session.queue
+        sources = {}
+        for i in [session.at, *session.upcoming_indices(session.lookahead)]:
+            track_id = queue.id_at(i)
+            source = SOURCE_CACHE.get(track_id)
+            if source is not None:
+                sources[track_id] = source
+
+        state = SessionState(
+            guild_id=session.guild.id,
+            voice_channel_id=session.voice_channel.id,
+            cmd_channel_id=session.cmd_channel.id,
+            commander_id=session.commander.id,
+            at=session.at,
+            position=session.now_duration,
+            style=session.style.name,
+            volume=session.volume,
+            auto_queue=session.is_auto_queue,
+            paused=bool(session.voice_client and session.voice_client.is_paused()),
+            sources=sources,
+            saved_at=time.time(),
+        )
+
+        saved = self._saved.get(state.guild_id)
+        if saved is not None and saved[0] is queue and saved[1] == queue.version:
+            start = saved[2]
+        else:
+            start = 0
+        rows = [queue.row(i) for i in range(start, len(queue))]
+        self._saved[state.guild_id] = (queue, queue.version, len(queue))
+        return state, start, rows
+
+    def write(self, state: SessionState, start: int, rows: List[TrackRow]):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?)",
+                (state.guild_id, json.dumps(state.__dict__)),
+            )
+            if start == 0:
+                self._db.execute("DELETE FROM tracks WHERE guild_id = ?", (state.guild_id,))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (state.guild_id, start + i, track_id, title, json.dumps(artists), *rest)
+                    for i, (track_id, title, artists, *rest) in enumerate(rows)
+                ),
+            )
+            self._db.commit()
+
+    def invalidate(self, guild_id: int):
+        """
+        Makes the next snapshot of the guild rewrite its whole queue, for when
+        a write didn't make it to the disk.
+        """
+        self._saved.pop(guild_id, None)
+
+    def forget(self, guild_id: int):
+        self._saved.pop(guild_id, None)
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE guild_id = ?", (guild_id,))
+            self._db.execute("DELETE FROM tracks WHERE guild_id = ?", (guild_id,))
+            self._db.commit()
+
+    def saved_guilds(self) -> List[int]:
+        return list(self._saved)
+
+    def load(self) -> List[Tuple[SessionState, List[TrackRow]]]:
+        """
+        Every saved session along with its queue.
+        """
+        with self._lock:
+            states = self._db.execute("SELECT state FROM sessions").fetchall()
+            snapshots = []
+            for (payload,) in states:
+                state = SessionState(**json.loads(payload))
+                rows = [
+                    (track_id, title, tuple(json.loads(artists)), *rest)
+                    for track_id, title, artists, *rest in self._db.execute(
+                        "SELECT id, title, artists, url, thumbnail, duration, type, "
+                        "commander_id, flags FROM tracks WHERE guild_id = ? ORDER BY position",
+                        (state.guild_id,),
+                    )
+                ]
+                snapshots.append((state, rows))  # type: ignore
+            return snapshots
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
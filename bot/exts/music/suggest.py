@@ -0,0 +1,113 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from bot.constants import SUGGESTION_GLOBAL_SIZE, SUGGESTION_GUILD_SIZE
+
+
+@dataclass
+class Suggestion:
+    title: str
+    value: str  # what /play gets when the suggestion is picked
+    plays: int = 0
+    keys: List[str] = field(default_factory=list)
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Played tracks searchable by the prefix of any word in their title or
+    artists, kept as a sorted array of keys that is binary searched.
+
+    Every word of "<title> <artists>" starts a key, so both "of yo" and
+    "sheeran" find "Shape of You" by Ed Sheeran. Once full, the track that was
+    played the longest time ago is dropped.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._keys: List[Tuple[str, str]] = []  # sorted (key, value)
+        self._entries: "OrderedDict[str, Suggestion]" = OrderedDict()  # value -> suggestion
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _index_keys(self, title: str, artists: List[str]) -> List[str]:
+        words = normalize(" ".join([title, *artists])).split(" ")
+        return list({" ".join(words[i:]) for i in range(len(words))})
+
+    def add(self, title: str, artists: List[str], value: str):
+        entry = self._entries.get(value)
+        if entry is None:
+            entry = self._entries[value] = Suggestion(
+                title, value, keys=self._index_keys(title, artists)
+            )
+            for key in entry.keys:
+                insort(self._keys, (key, value))
+        entry.plays += 1
+        self._entries.move_to_end(value)
+
+        while len(self._entries) > self.maxsize:
+            _, evicted = self._entries.popitem(last=False)
+            for key in evicted.keys:
+                del self._keys[bisect_left(self._keys, (key, evicted.value))]
+
+    def search(self, prefix: str, limit: int, scan: int = 500) -> List[Suggestion]:
+        """
+        Suggestions with a word starting with prefix, most played first. At
+        most `scan` keys are looked at so long lists of matches stay cheap.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        found: Dict[str, Suggestion] = {}
+        i = bisect_left(self._keys, (prefix, ""))
+        end = min(i + scan, len(self._keys))
+        while i < end and self._keys[i][0].startswith(prefix):
+            value = self._keys[i][1]
+            found[value] = self._entries[value]
+            i += 1
+        return sorted(found.values(), key=lambda entry: -entry.plays)[:limit]
+
+
+class TrackSuggestions:
+    """
+    A prefix index of the tracks played in every guild along with one of the
+    tracks played anywhere.
+    """
+
+    def __init__(self, guild_size: int, global_size: int) -> None:
+        self.guild_size = guild_size
+        self.everywhere = PrefixIndex(global_size)
+        self._guilds: Dict[int, PrefixIndex] = {}
+
+    def record(self, guild_id: int, title: str, artists: List[str], value: str):
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            guild = self._guilds[guild_id] = PrefixIndex(self.guild_size)
+        guild.add(title, artists, value)
+        self.everywhere.add(title, artists, value)
+
+    def complete(self, guild_id: int, prefix: str, limit: int = 25) -> List[Suggestion]:
+        """
+        Suggestions from the guild's own plays first, topped up with the ones
+        from everywhere else.
+        """
+        guild = self._guilds.get(guild_id)
+        suggestions = guild.search(prefix, limit) if guild is not None else []
+        if len(suggestions) < limit:
+            seen = {entry.value for entry in suggestions}
+            suggestions += [
+                entry
+                for entry in self.everywhere.search(prefix, limit)
+                if entry.value not in seen
+            ][: limit - len(suggestions)]
+        return suggestions
+
+
+SUGGESTIONS = TrackSuggestions(SUGGESTION_GUILD_SIZE, SUGGESTION_GLOBAL_SIZE)
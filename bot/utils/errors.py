@@ -1,3 +1,13 @@
 """
 A Module for custom or subclassed Error types.
-"""
\ No newline at end of file
+"""
+
+
+class SpotifyError(Exception):
+    """
+    Raised when the spotify web api answers with an error status.
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
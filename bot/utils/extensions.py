@@ -1,4 +1,4 @@
-import importlib
+import ast
 
 from os import listdir
 
@@ -7,28 +7,33 @@ class Path:
     LAYER2 = ['exts', 'assets', 'utils']
     LAYER3 = ['admin']
 
+def has_setup(file_path: str) -> bool:
+    """
+    Checks for a module level setup function by parsing the module instead of
+    importing it, so discovering cogs doesn't pay for their imports.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        tree = ast.parse(file.read(), filename=file_path)
+    return any(
+        isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == 'setup'
+        for node in tree.body
+    )
+
 def get_extensions():
     """
     Loops through directories and subdirectories to find for cogs that can be
     load into
     """
     base = f'./{Path.LAYER1}/{Path.LAYER2[0]}/'
-    path = ''
     for subdirectory in listdir(base):
-        path += f'{Path.LAYER1}.{Path.LAYER2[0]}.{subdirectory}.'
+        path = f'{Path.LAYER1}.{Path.LAYER2[0]}.{subdirectory}.'
 
         for file in listdir(base+subdirectory):
-            if file.startswith("_"):
+            if file.startswith("_") or not file.endswith(".py"):
+                continue
+            # Target module doesn't have a setup function--is not a cog
+            if not has_setup(base+subdirectory+'/'+file):
                 continue
-            if file.endswith("py"):
-                if not file.startswith("IO"):
-                    mod = importlib.import_module(path+file[:-3])
-                    # Target module doesn't have a setup function--is not a cog
-                    if getattr(mod, "setup", None) is None:
-                        continue
-                path += str(file)[:-3]
-                yield path
-            path = '.'.join(path.split('.')[:-1]) + '.'
-        path = ''
+            yield path + file[:-3]
 
-EXTENSIONS = frozenset(get_extensions())
\ No newline at end of file
+EXTENSIONS = frozenset(get_extensions())
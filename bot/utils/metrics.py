@@ -0,0 +1,219 @@
+import time
+
+from aiohttp import web
+from bisect import bisect_left
+from contextlib import contextmanager
+from discord import AudioSource
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from bot.constants import METRICS_HOST, METRICS_PORT
+
+# upper bounds in seconds, the last bucket catches everything slower
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+# the stages between /play and audio, in the order they happen
+PLAY_STAGES = (
+    "search",
+    "load_all",
+    "get_source",
+    "ensure_voice_connection",
+    "ffmpeg_spawn",
+    "first_packet",
+)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket the q-th quantile falls into.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class StageMetrics:
+    """
+    Latency histograms of every stage, kept separately for every guild.
+
+    Stages are also observed from the voice client's player thread, so every
+    access is guarded by a lock.
+    """
+
+    def __init__(self, name: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.buckets = buckets
+        self._histograms: Dict[Tuple[str, int], Histogram] = {}  # (stage, guild id) -> histogram
+        self._lock = Lock()
+
+    def observe(self, stage: str, guild_id: int, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((stage, guild_id))
+            if histogram is None:
+                histogram = self._histograms[stage, guild_id] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str, guild_id: int) -> Iterator[None]:
+        """
+        Observes how long the body takes, a body that raises is not recorded.
+        """
+        start = time.perf_counter()
+        yield
+        self.observe(stage, guild_id, time.perf_counter() - start)
+
+    def stages(self, guild_id: Optional[int] = None) -> Dict[str, Histogram]:
+        """
+        The histograms of every stage merged across guilds, or of a single guild.
+        """
+        merged: Dict[str, Histogram] = {}
+        with self._lock:
+            for (stage, guild), histogram in self._histograms.items():
+                if guild_id is not None and guild != guild_id:
+                    continue
+                merged.setdefault(stage, Histogram(self.buckets)).merge(histogram)
+        return merged
+
+    def render(self) -> str:
+        """
+        The histograms in the prometheus text exposition format.
+        """
+        lines = [f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for (stage, guild_id), histogram in sorted(self._histograms.items()):
+                labels = f'stage="{stage}",guild="{guild_id}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{self.name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+PLAY_LATENCY = StageMetrics("kwe_play_stage_seconds")
+
+
+class ShardMetrics:
+    """
+    Gauges and counters labelled by shard.
+    """
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+        self._values: Dict[Tuple[str, int], float] = {}  # (name, shard id) -> value
+        self._lock = Lock()
+
+    def set(self, name: str, shard_id: int, value: float):
+        with self._lock:
+            self._values[name, shard_id] = value
+
+    def inc(self, name: str, shard_id: int, amount: float = 1):
+        with self._lock:
+            self._values[name, shard_id] = self._values.get((name, shard_id), 0) + amount
+
+    def get(self, name: str, shard_id: int) -> float:
+        return self._values.get((name, shard_id), 0)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, shard_id), value in sorted(self._values.items()):
+                lines.append(f'{self.prefix}_{name}{{shard="{shard_id}"}} {value}')
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+SHARD_METRICS = ShardMetrics("kwe_shard")
+
+
+class FirstPacketProbe(AudioSource):
+    """
+    Wraps an audio source and observes how long it takes from the wrap until
+    the source produces its first packet.
+    """
+
+    def __init__(
+        self, source: AudioSource, guild_id: int, metrics: StageMetrics = PLAY_LATENCY
+    ) -> None:
+        self.source = source
+        self.guild_id = guild_id
+        self.metrics = metrics
+        self._started_at: Optional[float] = time.perf_counter()
+
+    def read(self) -> bytes:
+        data = self.source.read()
+        if data and self._started_at is not None:
+            self.metrics.observe(
+                "first_packet", self.guild_id, time.perf_counter() - self._started_at
+            )
+            self._started_at = None
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class MetricsServer:
+    """
+    Serves the metrics at /metrics for a prometheus scraper.
+    """
+
+    def __init__(
+        self, metrics: List[Union[StageMetrics, ShardMetrics]], host: str, port: int
+    ) -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text="".join(metrics.render() for metrics in self.metrics),
+            content_type="text/plain",
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"[Metrics] Serving on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+METRICS_SERVER = MetricsServer([PLAY_LATENCY, SHARD_METRICS], METRICS_HOST, METRICS_PORT)
@@ -1,12 +1,13 @@
 from discord.ext import commands
 from discord import Intents, Status
 from datetime import datetime
+from time import perf_counter
 
 from bot.utils.extensions import EXTENSIONS
-from bot.constants import DEBUG_SERVER_IDS, PREFIX, DISCORD_TOKEN
+from bot.constants import DEBUG_SERVER_IDS, PREFIX, DISCORD_TOKEN, SHARDED, SHARD_COUNT
 
 
-class BotWrap(commands.Bot):
+class BotWrap(commands.AutoShardedBot if SHARDED else commands.Bot):
     EXTENSIONS = EXTENSIONS # type: ignore
 
     def __init__(self):
@@ -17,13 +18,22 @@ class BotWrap(commands.Bot):
             intents=intents,
             case_insensitive=True,
             status=Status.online,
-            debug_guilds=DEBUG_SERVER_IDS
+            debug_guilds=DEBUG_SERVER_IDS,
+            **({"shard_count": SHARD_COUNT} if SHARDED and SHARD_COUNT else {})
         )
 
         self.active_since = datetime.now() # type: ignore
 
+        # how long every extension took to import and set up
+        self.load_times = {}
         for ext in EXTENSIONS:
+            started = perf_counter()
             self.load_extension(ext)
+            self.load_times[ext] = perf_counter() - started
+
+        print(f"Loaded {len(EXTENSIONS)} extensions in {sum(self.load_times.values()):.2f}s")
+        for ext, seconds in sorted(self.load_times.items(), key=lambda item: -item[1]):
+            print(f"  {seconds:6.3f}s {ext}")
 
     async def on_ready(self):
         print(f"{bot.user.name} is on ready.") # type: ignore